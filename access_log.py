@@ -0,0 +1,160 @@
+import json
+import logging
+from logging.handlers import QueueHandler, QueueListener
+import queue
+import random
+from typing import Any, Dict, Optional
+
+LOG_FORMAT = "[%(asctime)s] %(levelname).1s %(message)s"
+LOG_DATE_FORMAT = "%Y.%m.%d %H:%M:%S"
+LOG_QUEUE_SIZE = 10000
+LOG_MAX_BODY = 1024
+ACCESS_FIELDS = ("request_id", "path", "code", "duration", "context", "request", "response")
+
+logger = logging.getLogger("access")
+
+
+def log_access(
+    request_id: str,
+    path: str,
+    code: int,
+    duration: float,
+    context: Dict[str, Any] = None,
+    request: Optional[bytes] = None,
+    response: Optional[bytes] = None,
+):
+    """
+    Log a single record of the request, the fields are formatted
+    by the listener thread
+    """
+    if not logger.isEnabledFor(logging.INFO):
+        return
+    fields = {
+        "request_id": request_id,
+        "path": path,
+        "code": code,
+        "duration": round(duration * 1000, 3),
+        "context": context,
+        "request": request,
+        "response": response,
+    }
+    logger.info("%s %s %s", path, code, request_id, extra=fields)
+
+
+def get_access_fields(record: logging.LogRecord, max_body: int) -> Dict[str, Any]:
+    fields = {}
+    for name in ACCESS_FIELDS:
+        value = getattr(record, name, None)
+        if value is None:
+            continue
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            text = bytes(value[:max_body]).decode("utf-8", "replace")
+            value = text + "..." if len(value) > max_body else text
+        fields[name] = value
+    return fields
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats records as JSON lines, request and response bodies are truncated
+    """
+
+    def __init__(self, max_body=LOG_MAX_BODY, datefmt=LOG_DATE_FORMAT):
+        super().__init__(datefmt=datefmt)
+        self.max_body = max_body
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": self.formatTime(record, self.datefmt),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        data.update(get_access_fields(record, self.max_body))
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """
+    Formats records as text lines, request and response bodies are truncated
+    """
+
+    def __init__(self, max_body=LOG_MAX_BODY, fmt=LOG_FORMAT, datefmt=LOG_DATE_FORMAT):
+        super().__init__(fmt=fmt, datefmt=datefmt)
+        self.max_body = max_body
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        message = super().formatMessage(record)
+        fields = get_access_fields(record, self.max_body)
+        for name in ("request_id", "path", "code"):
+            fields.pop(name, None)
+        if fields:
+            message += " " + " ".join("%s=%s" % item for item in fields.items())
+        return message
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Passes a share of successful requests, other records always pass
+    """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "code", None) != 200:
+            return True
+        return random.random() < self.rate
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    Hands records to the listener thread unformatted,
+    records are dropped when the queue is full
+    """
+
+    def __init__(self, queue_):
+        super().__init__(queue_)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging(
+    filename: str = None,
+    log_format="json",
+    sample_rate=1.0,
+    max_body=LOG_MAX_BODY,
+    level=logging.INFO,
+    queue_size=LOG_QUEUE_SIZE,
+) -> QueueListener:
+    """
+    Configure root logger writing to the file from a listener thread,
+    the returned listener is to be stopped on exit
+    """
+    handler = logging.FileHandler(filename) if filename else logging.StreamHandler()
+    if log_format == "json":
+        handler.setFormatter(JsonFormatter(max_body=max_body))
+    else:
+        handler.setFormatter(TextFormatter(max_body=max_body))
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.handlers = [DroppingQueueHandler(queue.Queue(queue_size))]
+    logger.filters = []
+    if sample_rate < 1:
+        logger.addFilter(SamplingFilter(sample_rate))
+
+    listener = QueueListener(root.handlers[0].queue, handler)
+    listener.start()
+    return listener
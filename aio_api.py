@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+from http import HTTPStatus
+import logging
+from optparse import OptionParser
+import time
+from typing import Dict, Optional, Tuple
+import uuid
+
+import access_log
+from api import (
+    BAD_REQUEST,
+    BODY_TIMEOUT,
+    HTTP_LATENCY,
+    HTTP_REQUESTS,
+    IDLE_TIMEOUT,
+    INTERNAL_ERROR,
+    MAX_BODY_SIZE,
+    MAX_KEEPALIVE_REQUESTS,
+    NOT_FOUND,
+    OK,
+    REQUEST_ENTITY_TOO_LARGE,
+    REQUEST_TIMEOUT,
+    STORES,
+    STREAM_PAGE_SIZE,
+    ClientInterestsHandler,
+    InterestsStream,
+    StreamEncoder,
+    make_response,
+    make_store,
+    method_handler_async,
+)
+import json_codec
+import metrics
+from storage import (
+    ASYNC_WORKERS,
+    CACHE_SIZE,
+    CACHE_TTL,
+    POOL_MAX_SIZE,
+    POOL_MIN_SIZE,
+    POOL_TIMEOUT,
+    AsyncTarantoolConnection,
+    LocalCache,
+)
+
+MAX_HEADERS = 100
+
+
+class AsyncHTTPServer:
+    """
+    Asyncio HTTP/1.1 server of the scoring api
+    with persistent and pipelined connections
+    """
+
+    router = {"method": method_handler_async}
+
+    def __init__(
+        self,
+        store,
+        idle_timeout=IDLE_TIMEOUT,
+        max_requests=MAX_KEEPALIVE_REQUESTS,
+        codec=None,
+        max_body_size=MAX_BODY_SIZE,
+        body_timeout=BODY_TIMEOUT,
+    ):
+        self.store = store
+        self.codec = codec or json_codec.get_codec()
+        self.max_body_size = max_body_size
+        self.body_timeout = body_timeout
+        self.idle_timeout = idle_timeout
+        self.max_requests = max_requests
+
+    async def read_request(self, reader) -> Optional[Tuple[str, str, str, Dict[str, str]]]:
+        line = await asyncio.wait_for(reader.readline(), self.idle_timeout)
+        if not line:
+            return None
+        method, path, version = line.decode("latin-1").split()
+        # headers must be read in time, however slowly they are sent
+        headers = await asyncio.wait_for(self.read_headers(reader), self.body_timeout)
+        return method, path, version, headers
+
+    async def read_headers(self, reader) -> Dict[str, str]:
+        headers = {}
+        for _ in range(MAX_HEADERS):
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        else:
+            raise ValueError("Too many headers")
+        return headers
+
+    async def read_body(self, reader, headers: Dict[str, str]) -> Tuple[int, bytes]:
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            return BAD_REQUEST, b""
+        if length < 0:
+            return BAD_REQUEST, b""
+        if length > self.max_body_size:
+            return REQUEST_ENTITY_TOO_LARGE, b""
+        try:
+            return OK, await asyncio.wait_for(reader.readexactly(length), self.body_timeout)
+        except asyncio.TimeoutError:
+            return REQUEST_TIMEOUT, b""
+        except asyncio.IncompleteReadError:
+            return BAD_REQUEST, b""
+
+    def is_keep_alive(self, version: str, headers: Dict[str, str]) -> bool:
+        connection = headers.get("connection", "").lower()
+        if version == "HTTP/1.1":
+            return connection != "close"
+        return connection == "keep-alive"
+
+    async def handle_connection(self, reader, writer):
+        try:
+            for requests_count in range(1, self.max_requests + 1):
+                try:
+                    request = await self.read_request(reader)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except ValueError:
+                    body = self.codec.dumps(make_response(BAD_REQUEST, None))
+                    self.write_response(writer, BAD_REQUEST, body, False)
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+
+                started = time.monotonic()
+                method, path, version, headers = request
+                keep_alive = self.is_keep_alive(version, headers) and requests_count < self.max_requests
+                if "transfer-encoding" in headers:
+                    code, data = BAD_REQUEST, b""
+                else:
+                    code, data = await self.read_body(reader, headers)
+                if code != OK:
+                    # unread body breaks framing of the next request
+                    keep_alive = False
+                elif method == "GET":
+                    self.write_get(writer, path, keep_alive)
+                    await writer.drain()
+                    if not keep_alive:
+                        break
+                    continue
+                elif method != "POST":
+                    code = BAD_REQUEST
+
+                code, body, context = await self.handle_request(code, path, headers, data)
+                if isinstance(body, InterestsStream):
+                    keep_alive = await self.write_stream(writer, body, version, keep_alive)
+                    body = None
+                else:
+                    self.write_response(writer, code, body, keep_alive)
+                    await writer.drain()
+                duration = time.monotonic() - started
+                HTTP_REQUESTS.inc(code)
+                HTTP_LATENCY.observe(duration)
+                access_log.log_access(context["request_id"], path, code, duration, context, data, body)
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def handle_request(self, code: int, path: str, headers: Dict[str, str], data: bytes):
+        response = {}
+        context = {"request_id": headers.get("x-request-id", uuid.uuid4().hex)}
+        request = None
+        if code == OK:
+            try:
+                request = self.codec.loads(data)
+            except:
+                code = BAD_REQUEST
+
+        if request:
+            path = path.strip("/")
+            if path in self.router:
+                try:
+                    response, code = await self.router[path]({"body": request, "headers": headers}, context, self.store)
+                except Exception as e:
+                    logging.exception("Unexpected error: %s" % e)
+                    code = INTERNAL_ERROR
+            else:
+                code = NOT_FOUND
+
+        if code == OK and isinstance(response, InterestsStream):
+            return code, response, context
+        return code, self.codec.dumps(make_response(code, response)), context
+
+    def write_get(self, writer, path: str, keep_alive: bool):
+        if path.strip("/") == "metrics":
+            self.write_response(writer, OK, metrics.render(), keep_alive, metrics.CONTENT_TYPE)
+        else:
+            self.write_response(writer, NOT_FOUND, self.codec.dumps(make_response(NOT_FOUND, None)), keep_alive)
+
+    def write_response(self, writer, code: int, body: bytes, keep_alive: bool, content_type="application/json"):
+        head = (
+            "HTTP/1.1 {} {}\r\n"
+            "Content-Type: {}\r\n"
+            "Content-Length: {}\r\n"
+            "Connection: {}\r\n\r\n"
+        ).format(code, HTTPStatus(code).phrase, content_type, len(body), "keep-alive" if keep_alive else "close")
+        writer.write(head.encode("latin-1") + body)
+
+    async def write_stream(self, writer, stream: InterestsStream, version: str, keep_alive: bool) -> bool:
+        """
+        Write chunked response of the stream, returns whether
+        the connection can be kept alive
+        """
+        chunked = version != "HTTP/1.0"
+        keep_alive = keep_alive and chunked
+        head = (
+            "HTTP/1.1 200 OK\r\n"
+            "Content-Type: application/json\r\n"
+            "{}"
+            "Connection: {}\r\n\r\n"
+        ).format("Transfer-Encoding: chunked\r\n" if chunked else "", "keep-alive" if keep_alive else "close")
+        writer.write(head.encode("latin-1"))
+
+        encoder = StreamEncoder(self.codec, chunked)
+        try:
+            writer.write(encoder.begin())
+            async for page in stream:
+                writer.write(encoder.encode(page))
+                await writer.drain()
+            writer.write(encoder.end())
+        except Exception as e:
+            # status is sent already, broken connection tells the client about the error
+            logging.exception("Unexpected error: %s" % e)
+            return False
+        await writer.drain()
+        return keep_alive
+
+
+async def serve(host: str, port: int, server: AsyncHTTPServer):
+    srv = await asyncio.start_server(server.handle_connection, host, port)
+    async with srv:
+        await srv.serve_forever()
+
+
+if __name__ == "__main__":
+    op = OptionParser()
+    op.add_option("-p", "--port", action="store", type=int, default=8080)
+    op.add_option("-l", "--log", action="store", default=None)
+    op.add_option("--idle-timeout", action="store", type=float, default=IDLE_TIMEOUT)
+    op.add_option("--max-requests", action="store", type=int, default=MAX_KEEPALIVE_REQUESTS)
+    op.add_option("--storage-threads", action="store", type=int, default=ASYNC_WORKERS)
+    op.add_option("--cache-size", action="store", type=int, default=CACHE_SIZE)
+    op.add_option("--cache-ttl", action="store", type=float, default=CACHE_TTL)
+    op.add_option("--pool-min", action="store", type=int, default=POOL_MIN_SIZE)
+    op.add_option("--pool-max", action="store", type=int, default=POOL_MAX_SIZE)
+    op.add_option("--pool-timeout", action="store", type=float, default=POOL_TIMEOUT)
+    op.add_option("--json-codec", action="store", choices=list(json_codec.CODECS), default=None)
+    op.add_option("--store", action="store", choices=STORES, default=STORES[0])
+    op.add_option("--stream-threshold", action="store", type=int, default=None)
+    op.add_option("--stream-page-size", action="store", type=int, default=STREAM_PAGE_SIZE)
+    op.add_option("--max-body-size", action="store", type=int, default=MAX_BODY_SIZE)
+    op.add_option("--body-timeout", action="store", type=float, default=BODY_TIMEOUT)
+    op.add_option("--log-format", action="store", choices=["json", "text"], default="json")
+    op.add_option("--log-sample", action="store", type=float, default=1.0)
+    op.add_option("--log-max-body", action="store", type=int, default=access_log.LOG_MAX_BODY)
+    (opts, args) = op.parse_args()
+    listener = access_log.setup_logging(opts.log, opts.log_format, opts.log_sample, opts.log_max_body)
+    ClientInterestsHandler.stream_threshold = opts.stream_threshold
+    ClientInterestsHandler.page_size = opts.stream_page_size
+    cache = LocalCache(opts.cache_size, opts.cache_ttl) if opts.cache_size > 0 else None
+    store = AsyncTarantoolConnection(
+        make_store(cache, opts.pool_min, opts.pool_max, opts.pool_timeout, opts.store), max_workers=opts.storage_threads
+    )
+    logging.info("Starting asyncio server at %s" % opts.port)
+    try:
+        server = AsyncHTTPServer(
+            store,
+            idle_timeout=opts.idle_timeout,
+            max_requests=opts.max_requests,
+            codec=json_codec.get_codec(opts.json_codec),
+            max_body_size=opts.max_body_size,
+            body_timeout=opts.body_timeout,
+        )
+        asyncio.run(serve("localhost", opts.port, server))
+    except KeyboardInterrupt:
+        pass
+    store.close()
+    if cache is not None:
+        logging.info("Local cache stats: %s" % cache.stats())
+    logging.info("Stopped server")
+    listener.stop()
@@ -1,18 +1,29 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import cProfile
 import datetime
+import functools
 import hashlib
+import hmac
 from http.server import HTTPServer, BaseHTTPRequestHandler
-import json
 import logging
 from optparse import OptionParser
-from typing import Dict, Any
+import os
+import re
+import selectors
+import signal
+import threading
+import time
+from typing import Dict, Any, List, Optional, Tuple
 import uuid
 
 from class_fields import (
     Field,
     ArgumentsField,
+    ArgumentsListField,
     BirthDayField,
     CharField,
     ClientIDsField,
@@ -21,8 +32,21 @@ from class_fields import (
     GenderField,
     PhoneField,
 )
+import access_log
+import json_codec
+import metrics
 import scoring
-from storage import TarantoolConnection
+from storage import (
+    CACHE_SIZE,
+    CACHE_TTL,
+    POOL_MAX_SIZE,
+    POOL_MIN_SIZE,
+    POOL_TIMEOUT,
+    CachedStorage,
+    InMemoryStorage,
+    LocalCache,
+    TarantoolPool,
+)
 
 SALT = "Otus"
 ADMIN_LOGIN = "admin"
@@ -31,26 +55,75 @@ OK = 200
 BAD_REQUEST = 400
 FORBIDDEN = 403
 NOT_FOUND = 404
+REQUEST_TIMEOUT = 408
+REQUEST_ENTITY_TOO_LARGE = 413
 INVALID_REQUEST = 422
 INTERNAL_ERROR = 500
 ERRORS = {
     BAD_REQUEST: "Bad Request",
     FORBIDDEN: "Forbidden",
     NOT_FOUND: "Not Found",
+    REQUEST_TIMEOUT: "Request Timeout",
+    REQUEST_ENTITY_TOO_LARGE: "Request Entity Too Large",
     INVALID_REQUEST: "Invalid Request",
     INTERNAL_ERROR: "Internal Server Error",
 }
+DEFAULT_WORKERS = 1
+DEFAULT_THREADS = 16
+IDLE_TIMEOUT = 15
+# idle keep-alive connection checks this often whether clients wait for a thread
+IDLE_POLL_INTERVAL = 0.05
+MAX_KEEPALIVE_REQUESTS = 1000
+AUTH_CACHE_SIZE = 1024
+STREAM_PAGE_SIZE = 1000
+MAX_BODY_SIZE = 10 * 1024 * 1024
+BODY_TIMEOUT = 30
+READ_CHUNK_SIZE = 64 * 1024
+PROFILE_HEADER = "X-Profile"
+PROFILE_VALUE = "1"
+# request id names the profile file
+PROFILE_NAME = re.compile(r"^[\w-]{1,128}$", re.ASCII)
+# in-memory store stands in for Tarantool in benchmarks
+STORES = ["tarantool", "memory"]
+
+HTTP_REQUESTS = metrics.Counter("scoring_http_requests_total", "HTTP requests by response code", ("code",))
+HTTP_LATENCY = metrics.Histogram("scoring_http_request_duration_seconds", "HTTP request latency")
+METHOD_REQUESTS = metrics.Counter("scoring_method_requests_total", "Method requests", ("method",))
+METHOD_ERRORS = metrics.Counter("scoring_method_errors_total", "Failed method requests by code", ("method", "code"))
+METHOD_LATENCY = metrics.Histogram("scoring_method_duration_seconds", "Method handler latency", ("method",))
+# streamed interests are fetched after do, while the response is written,
+# so their lookups are observed as a stream stage of their own
+STAGE_LATENCY = metrics.Histogram(
+    "scoring_method_stage_duration_seconds", "Latency of validate, do and stream of the methods", ("method", "stage")
+)
+AUTH_LATENCY = metrics.Histogram("scoring_auth_duration_seconds", "check_auth latency")
+
+
+class RequestDataMeta(type):
+    """
+    Gathers the fields of the class once and gives their values
+    slots of the field names, so requests are created without a dict
+    """
 
+    def __new__(mcs, name, bases, namespace, **kwargs):
+        fields = tuple((k, v) for k, v in namespace.items() if isinstance(v, Field))
+        namespace.setdefault("__slots__", tuple("_" + k for k, _ in fields))
+        cls = super().__new__(mcs, name, bases, namespace, **kwargs)
+        # pairs of (argument name, field)
+        cls._fields = fields
+        return cls
+
+
+class RequestData(metaclass=RequestDataMeta):
+    _fields: Tuple[Tuple[str, Field], ...]
 
-class RequestData:
     def __init__(self, args: Dict[str, Any]):
         if args:
             errors = []
-            field_names = [k for k, v in self.generate_dict_field_items()]
 
-            for field_name in field_names:
+            for field_name, field in self._fields:
                 try:
-                    setattr(self, field_name, args.get(field_name))
+                    setattr(self, field.name, field.clean(args.get(field_name)))
                 except ValueError as e:
                     errors.append(str(e))
 
@@ -59,24 +132,113 @@ class RequestData:
         else:
             raise ValueError("Empty " + self.__class__.__name__ + ".")
 
-    def generate_dict_field_items(self):
-        for key, value in self.__class__.__dict__.items():
-            if isinstance(value, Field):
-                yield key, value
-
     def validate(self):
         pass
 
+    async def do_async(self, request, context: Dict[str, str], store) -> dict:
+        return self.do(request, context, store)
+
+
+class InterestsStream:
+    """
+    Interests of the clients fetched from the store page by page
+    while the response is being written
+    """
+
+    def __init__(self, store, client_ids: List[int], page_size=STREAM_PAGE_SIZE):
+        self.store = store
+        self.client_ids = list(dict.fromkeys(client_ids))
+        self.page_size = page_size
+
+    def pages(self):
+        for i in range(0, len(self.client_ids), self.page_size):
+            yield self.client_ids[i : i + self.page_size]
+
+    def __iter__(self):
+        elapsed = 0.0
+        try:
+            for page in self.pages():
+                started = time.perf_counter()
+                interests = scoring.get_interests_many(self.store, page)
+                elapsed += time.perf_counter() - started
+                yield interests
+        finally:
+            STAGE_LATENCY.observe(elapsed, "clients_interests", "stream")
+
+    async def __aiter__(self):
+        elapsed = 0.0
+        try:
+            for page in self.pages():
+                started = time.perf_counter()
+                interests = await scoring.get_interests_many_async(self.store, page)
+                elapsed += time.perf_counter() - started
+                yield interests
+        finally:
+            STAGE_LATENCY.observe(elapsed, "clients_interests", "stream")
+
+
+class StreamEncoder:
+    """
+    Encodes OK response of the pages of a dict piece by piece,
+    framed as HTTP chunks when the response is chunked
+    """
+
+    head = b'{"code": 200, "response": {'
+    tail = b"}}"
+    last_chunk = b"0\r\n\r\n"
+
+    def __init__(self, codec, chunked=False):
+        self.codec = codec
+        self.chunked = chunked
+        self.first = True
+
+    def begin(self) -> bytes:
+        return self.frame(self.head)
+
+    def encode(self, page: Dict[Any, Any]) -> bytes:
+        chunk = self.codec.dumps(page)[1:-1]
+        if chunk and not self.first:
+            chunk = b"," + chunk
+        elif chunk:
+            self.first = False
+        return self.frame(chunk)
+
+    def end(self) -> bytes:
+        if self.chunked:
+            return self.frame(self.tail) + self.last_chunk
+        return self.tail
+
+    def frame(self, chunk: bytes) -> bytes:
+        # empty chunk would end the response
+        if not chunk or not self.chunked:
+            return chunk
+        return b"%x\r\n%s\r\n" % (len(chunk), chunk)
+
 
 class ClientInterestsHandler(RequestData):
     client_ids = ClientIDsField(required=True)
     date = DateField(required=False, nullable=True)
+    # responses with more clients are streamed, None disables streaming
+    stream_threshold = None
+    page_size = STREAM_PAGE_SIZE
 
     def do(self, request: Dict[str, str], context: Dict[str, str], store) -> dict:
         context["nclients"] = len(self.client_ids)
-        interests = {cid: scoring.get_interests(store, cid) for cid in self.client_ids}
+        if self.is_streamed():
+            return InterestsStream(store, self.client_ids, self.page_size)
+        interests = scoring.get_interests_many(store, self.client_ids)
+        return interests
+
+    async def do_async(self, request, context: Dict[str, str], store) -> dict:
+        context["nclients"] = len(self.client_ids)
+        if self.is_streamed():
+            return InterestsStream(store, self.client_ids, self.page_size)
+        interests = await scoring.get_interests_many_async(store, self.client_ids)
         return interests
 
+    def is_streamed(self) -> bool:
+        return self.stream_threshold is not None and len(self.client_ids) > self.stream_threshold
+
     def validate(self):
         pass
 
@@ -98,10 +260,7 @@ class OnlineScoreHandler(RequestData):
             raise ValueError("Arguments must have at least one valid pair")
 
     def do(self, request, context: Dict[str, str], store: Dict[str, str]) -> dict:
-        context["has"] = []
-        for k, v in self.__class__.__dict__.items():
-            if isinstance(v, Field) and getattr(self, k) is not None:
-                context["has"].append(k)
+        context["has"] = self.get_has()
 
         if request.is_admin:
             score = 42
@@ -117,6 +276,60 @@ class OnlineScoreHandler(RequestData):
             )
         return {"score": score}
 
+    async def do_async(self, request, context: Dict[str, str], store) -> dict:
+        context["has"] = self.get_has()
+
+        if request.is_admin:
+            score = 42
+        else:
+            score = await scoring.get_score_async(
+                store,
+                self.phone,
+                self.email,
+                birthday=self.birthday,
+                gender=self.gender,
+                first_name=self.first_name,
+                last_name=self.last_name,
+            )
+        return {"score": score}
+
+    def get_has(self) -> List[str]:
+        return [k for k, v in self._fields if getattr(self, v.name) is not None]
+
+
+class OnlineScoreBatchHandler(RequestData):
+    items = ArgumentsListField(required=True, nullable=False)
+
+    def do(self, request, context: Dict[str, str], store) -> list:
+        context["nitems"] = len(self.items)
+        results = []
+        for arguments in self.items:
+            method, error = self.get_item_method(arguments)
+            if error:
+                results.append(error)
+            else:
+                results.append(make_response(OK, method.do(request, {}, store)))
+        return results
+
+    async def do_async(self, request, context: Dict[str, str], store) -> list:
+        context["nitems"] = len(self.items)
+        methods = [self.get_item_method(arguments) for arguments in self.items]
+        responses = await asyncio.gather(*(m.do_async(request, {}, store) for m, error in methods if not error))
+        responses = iter(responses)
+        return [error or make_response(OK, next(responses)) for _, error in methods]
+
+    def get_item_method(self, arguments: Dict[str, Any]):
+        """
+        Validate arguments of a single item, items are scored independently,
+        so an invalid item is reported instead of failing the whole batch
+        """
+        try:
+            method = OnlineScoreHandler(arguments)
+            method.validate()
+        except ValueError as e:
+            return None, make_response(INVALID_REQUEST, str(e))
+        return method, None
+
 
 class MethodRequest(RequestData):
     account = CharField(required=False, nullable=True)
@@ -130,108 +343,523 @@ class MethodRequest(RequestData):
         return self.login == ADMIN_LOGIN
 
 
+@functools.lru_cache(maxsize=AUTH_CACHE_SIZE)
+def get_user_token(account: str, login: str) -> bytes:
+    return hashlib.sha512((account + login + SALT).encode("utf-8")).hexdigest().encode("ascii")
+
+
+class AdminToken:
+    """
+    Admin token of the current hour, recomputed on the hour boundary
+    """
+
+    def __init__(self):
+        self.token = None
+        self.expires = 0.0
+
+    def __call__(self) -> bytes:
+        if time.time() >= self.expires:
+            hour = datetime.datetime.now().replace(minute=0, second=0, microsecond=0)
+            bytes = (hour.strftime("%Y%m%d%H") + ADMIN_SALT).encode("utf-8")
+            self.token = hashlib.sha512(bytes).hexdigest().encode("ascii")
+            self.expires = (hour + datetime.timedelta(hours=1)).timestamp()
+        return self.token
+
+
+admin_token = AdminToken()
+
+
 def check_auth(request) -> bool:
+    if not isinstance(request.token, str):
+        return False
     if request.is_admin:
-        bytes = (datetime.datetime.now().strftime("%Y%m%d%H") + ADMIN_SALT).encode("utf-8")
-        digest = hashlib.sha512(bytes).hexdigest()
+        digest = admin_token()
     else:
-        bytes = (request.account + request.login + SALT).encode("utf-8")
-        digest = hashlib.sha512(bytes).hexdigest()
-    if digest == request.token:
-        return True
-    return False
+        digest = get_user_token(request.account, request.login)
+    return hmac.compare_digest(digest, request.token.encode("utf-8"))
 
 
-def method_handler(request, ctx: Dict[str, str], store: Dict[str, str]):
-    request_router = {
-        "online_score": OnlineScoreHandler,
-        "clients_interests": ClientInterestsHandler,
-    }
+REQUEST_ROUTER = {
+    "online_score": OnlineScoreHandler,
+    "clients_interests": ClientInterestsHandler,
+    "online_score_batch": OnlineScoreBatchHandler,
+}
+
 
+def parse_method(request) -> Tuple[Any, int]:
+    """
+    Parse and authorize method request, validate arguments of the method.
+    Returns pair of (method request, method handler) on success
+    or an error message otherwise
+    """
     try:
         request = MethodRequest(request.get("body"))
         logging.debug("Request parsed correctly")
     except ValueError as e:
         return str(e), INVALID_REQUEST
-    if not check_auth(request):
+    with AUTH_LATENCY.time():
+        authorized = check_auth(request)
+    if not authorized:
         return ERRORS[FORBIDDEN], FORBIDDEN
 
-    try:
-        method = request_router[request.method](request.arguments)
-        method.validate()
-    except KeyError as e:
+    handler = REQUEST_ROUTER.get(request.method)
+    if handler is None:
         return "Method {} not found".format(request.method), INVALID_REQUEST
+    try:
+        with STAGE_LATENCY.time(request.method, "validate"):
+            method = handler(request.arguments)
+            method.validate()
     except ValueError as e:
         return str(e), INVALID_REQUEST
-    response = method.do(request, ctx, store)
+    return (request, method), OK
+
+
+def get_method_name(request) -> str:
+    # label values are limited to the known methods
+    body = request.get("body")
+    name = body.get("method") if isinstance(body, dict) else None
+    return name if isinstance(name, str) and name in REQUEST_ROUTER else "unknown"
+
+
+def observe_method(name: str, code: int, started: float):
+    METHOD_REQUESTS.inc(name)
+    if code in ERRORS:
+        METHOD_ERRORS.inc(name, code)
+    METHOD_LATENCY.observe(time.perf_counter() - started, name)
+
+
+def method_handler(request, ctx: Dict[str, str], store: Dict[str, str]):
+    started = time.perf_counter()
+    parsed, code = parse_method(request)
+    if code != OK:
+        observe_method(get_method_name(request), code, started)
+        return parsed, code
+    request, method = parsed
+    try:
+        with STAGE_LATENCY.time(request.method, "do"):
+            response = method.do(request, ctx, store)
+    except Exception:
+        observe_method(request.method, INTERNAL_ERROR, started)
+        raise
+    observe_method(request.method, OK, started)
 
     return response, OK
 
 
+async def method_handler_async(request, ctx: Dict[str, str], store):
+    started = time.perf_counter()
+    parsed, code = parse_method(request)
+    if code != OK:
+        observe_method(get_method_name(request), code, started)
+        return parsed, code
+    request, method = parsed
+    try:
+        with STAGE_LATENCY.time(request.method, "do"):
+            response = await method.do_async(request, ctx, store)
+    except Exception:
+        observe_method(request.method, INTERNAL_ERROR, started)
+        raise
+    observe_method(request.method, OK, started)
+
+    return response, OK
+
+
+def make_response(code: int, response: Any) -> Dict[str, Any]:
+    if code not in ERRORS:
+        return {"code": code, "response": response}
+    return {"code": code, "error": response or ERRORS.get(code, "Unknown Error")}
+
+
+def make_store(
+    cache: LocalCache = None, min_size=POOL_MIN_SIZE, max_size=POOL_MAX_SIZE, timeout=POOL_TIMEOUT, backend="tarantool"
+):
+    if backend == "memory":
+        store = InMemoryStorage()
+    else:
+        store = TarantoolPool(min_size=min_size, max_size=max_size, timeout=timeout)
+    if cache is not None:
+        return CachedStorage(store, cache)
+    return store
+
+
+class ThreadPoolHTTPServer(HTTPServer):
+    """
+    HTTP server processing requests in a bounded pool of threads.
+    Store is created by the first request, so every forked worker
+    gets its own storage connections
+    """
+
+    def __init__(self, server_address, handler_class, threads=DEFAULT_THREADS, store_factory=make_store):
+        super().__init__(server_address, handler_class)
+        self.store_factory = store_factory
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="worker")
+        # do not accept more connections than we can process soon
+        self.slots = threading.BoundedSemaphore(threads * 2)
+        # accepted connections not taken by a thread yet
+        self.waiting = 0
+        self.waiting_lock = threading.Lock()
+        self.store = None
+        self.store_lock = threading.Lock()
+
+    def get_store(self):
+        if self.store is None:
+            with self.store_lock:
+                if self.store is None:
+                    self.store = self.store_factory()
+        return self.store
+
+    def is_busy(self) -> bool:
+        """Whether accepted connections wait for a free thread"""
+        return self.waiting > 0
+
+    def process_request(self, request, client_address):
+        self.slots.acquire()
+        with self.waiting_lock:
+            self.waiting += 1
+        try:
+            self.executor.submit(self.process_request_thread, request, client_address)
+        except RuntimeError:
+            with self.waiting_lock:
+                self.waiting -= 1
+            self.slots.release()
+            self.shutdown_request(request)
+
+    def process_request_thread(self, request, client_address):
+        with self.waiting_lock:
+            self.waiting -= 1
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self.slots.release()
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=True)
+
+
+def serve_prefork(server: HTTPServer, workers: int, setup_logging=None):
+    """
+    Fork workers sharing the listening socket of the server
+    and wait for them in the master process.
+    Logging listener thread does not survive the fork,
+    so every worker sets up its own one
+    """
+    children = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            listener = setup_logging() if setup_logging else None
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            except Exception as e:
+                logging.exception("Worker error: %s" % e)
+                code = 1
+            finally:
+                server.server_close()
+                if listener is not None:
+                    listener.stop()
+            os._exit(code)
+        children.append(pid)
+        logging.info("Started worker %s" % pid)
+
+    try:
+        for pid in children:
+            os.waitpid(pid, 0)
+    except KeyboardInterrupt:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in children:
+            os.waitpid(pid, 0)
+
+
 class MainHTTPHandler(BaseHTTPRequestHandler):
     router = {"method": method_handler}
-    store = TarantoolConnection()
-    try:
-        store.connection = store.get_connection()
-    except Exception as e:
-        logging.exception("Storage connection error: %s" % e)
+    codec = json_codec.get_codec()
+    protocol_version = "HTTP/1.1"
+    # headers and body are sent apart, Nagle would delay the body until ACK
+    disable_nagle_algorithm = True
+    # idle keep-alive connection is closed after the timeout
+    timeout = IDLE_TIMEOUT
+    max_requests = MAX_KEEPALIVE_REQUESTS
+    max_body_size = MAX_BODY_SIZE
+    # whole body must be read in time, however slowly it is sent
+    body_timeout = BODY_TIMEOUT
+    # requests with the profile header are profiled when it is set
+    profile_dir = None
+    profile_lock = threading.Lock()
+
+    @property
+    def store(self):
+        return self.server.get_store()
+
+    def handle(self):
+        """
+        Handle requests of the connection while it is kept alive.
+        Idle connection holds a thread of the pool, so it is closed
+        as soon as other clients wait for a thread
+        """
+        self.requests_count = 0
+        self.close_connection = True
+        self.handle_one_request()
+        while not self.close_connection and self.wait_request():
+            self.handle_one_request()
+
+    def wait_request(self) -> bool:
+        """Wait until the next request arrives, the server gets busy or the connection idles out"""
+        self.connection.setblocking(False)
+        try:
+            buffered = self.rfile.peek(1)
+        except OSError:
+            buffered = b""
+        finally:
+            self.connection.settimeout(self.timeout)
+        if buffered:
+            return True
+
+        deadline = time.monotonic() + self.timeout
+        with selectors.DefaultSelector() as selector:
+            selector.register(self.connection, selectors.EVENT_READ)
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                if selector.select(min(remaining, IDLE_POLL_INTERVAL)):
+                    return True
+                if self.server.is_busy():
+                    return False
+
+    def read_body(self) -> Tuple[Optional[bytearray], int]:
+        """
+        Read the body in chunks from the socket, checking the size before and
+        the deadline while reading. Buffer grows as data arrives, so a client
+        lying about Content-Length does not make us allocate it
+        """
+        try:
+            length = int(self.headers["Content-Length"])
+        except (TypeError, ValueError):
+            return None, BAD_REQUEST
+        if length < 0:
+            return None, BAD_REQUEST
+        if length > self.max_body_size:
+            return None, REQUEST_ENTITY_TOO_LARGE
+
+        data = bytearray()
+        deadline = time.monotonic() + self.body_timeout
+        try:
+            while len(data) < length:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None, REQUEST_TIMEOUT
+                self.connection.settimeout(min(remaining, self.timeout))
+                chunk = self.rfile.read1(min(length - len(data), READ_CHUNK_SIZE))
+                if not chunk:
+                    return None, BAD_REQUEST
+                data += chunk
+        except TimeoutError:
+            return None, REQUEST_TIMEOUT
+        finally:
+            self.connection.settimeout(self.timeout)
+        return data, OK
 
     def get_request_id(self, headers: str):
         return headers.get("HTTP_X_REQUEST_ID", uuid.uuid4().hex)
 
+    def log_request(self, code="-", size="-"):
+        # requests are logged by the access log
+        pass
+
+    def log_message(self, format, *args):
+        logging.info("%s - %s", self.address_string(), format % args)
+
     def do_POST(self):
+        started = time.monotonic()
         response, code = {}, OK
         context = {"request_id": self.get_request_id(self.headers)}
         request = None
-        try:
-            data_string = self.rfile.read(int(self.headers["Content-Length"]))
-            request = json.loads(data_string)
-        except:
-            code = BAD_REQUEST
+        data_string, code = self.read_body()
+        if code == OK:
+            try:
+                request = self.codec.loads(data_string)
+            except:
+                code = BAD_REQUEST
 
         if request:
             path = self.path.strip("/")
-            logging.info("%s: %s %s" % (self.path, data_string, context["request_id"]))
             if path in self.router:
                 try:
-                    response, code = self.router[path]({"body": request, "headers": self.headers}, context, self.store)
+                    response, code = self.call_handler(path, {"body": request, "headers": self.headers}, context)
                 except Exception as e:
                     logging.exception("Unexpected error: %s" % e)
                     code = INTERNAL_ERROR
             else:
                 code = NOT_FOUND
 
+        self.requests_count += 1
+        if code == OK and isinstance(response, InterestsStream):
+            self.write_stream(response, context)
+            self.log_access(context, code, started, data_string)
+            return
+
+        json_str = self.codec.dumps(make_response(code, response))
+
         self.send_response(code)
         self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(json_str)))
+        # unread body breaks framing of the next request on the connection
+        if data_string is None or self.requests_count >= self.max_requests:
+            self.send_header("Connection", "close")
         self.end_headers()
-        if code not in ERRORS:
-            r = {"code": code, "response": response}
-        else:
-            r = {"code": code, "error": response or ERRORS.get(code, "Unknown Error")}
-        context.update(r)
-        logging.info(context)
-        json_str = json.dumps(r)
-        json_str = json_str.encode("utf-8")
         self.wfile.write(json_str)
+        self.log_access(context, code, started, data_string, json_str)
         return
 
+    def call_handler(self, path: str, request: Dict[str, Any], context: Dict[str, Any]):
+        handler = self.router[path]
+        if self.profile_dir is None or self.headers.get(PROFILE_HEADER) != PROFILE_VALUE:
+            return handler(request, context, self.store)
+        # since Python 3.12 a single profiler may be active in the process,
+        # requests coming while another one is profiled are not profiled
+        if not self.profile_lock.acquire(blocking=False):
+            logging.warning("Profiler is busy, request %s is not profiled" % context["request_id"])
+            return handler(request, context, self.store)
+        try:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError as e:
+                # profiling tool of its own, like a debugger or coverage
+                logging.warning("Profiler error: %s" % e)
+                return handler(request, context, self.store)
+            try:
+                return handler(request, context, self.store)
+            finally:
+                profiler.disable()
+                self.dump_profile(profiler, context)
+        finally:
+            self.profile_lock.release()
+
+    def dump_profile(self, profiler: cProfile.Profile, context: Dict[str, Any]):
+        """
+        Dump stats of the request to <profile dir>/<request id>.prof,
+        request ids unfit for a file name are replaced
+        """
+        name = context["request_id"]
+        if not isinstance(name, str) or not PROFILE_NAME.match(name):
+            name = uuid.uuid4().hex
+        filename = os.path.join(self.profile_dir, name + ".prof")
+        try:
+            profiler.dump_stats(filename)
+        except OSError as e:
+            logging.exception("Profile dump error: %s" % e)
+            return
+        context["profile"] = filename
+
+    def do_GET(self):
+        if self.path.strip("/") == "metrics":
+            code, body, content_type = OK, metrics.render(), metrics.CONTENT_TYPE
+        else:
+            code, body, content_type = NOT_FOUND, self.codec.dumps(make_response(NOT_FOUND, None)), "application/json"
+        self.requests_count += 1
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if self.requests_count >= self.max_requests:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_access(self, context: Dict[str, Any], code: int, started: float, request, response=None):
+        duration = time.monotonic() - started
+        HTTP_REQUESTS.inc(code)
+        HTTP_LATENCY.observe(duration)
+        access_log.log_access(context["request_id"], self.path, code, duration, context, request, response)
+
+    def write_stream(self, stream: InterestsStream, context: Dict[str, Any]):
+        chunked = self.request_version != "HTTP/1.0"
+        self.send_response(OK)
+        self.send_header("Content-Type", "application/json")
+        if chunked:
+            self.send_header("Transfer-Encoding", "chunked")
+        if not chunked or self.requests_count >= self.max_requests:
+            self.send_header("Connection", "close")
+        self.end_headers()
+
+        encoder = StreamEncoder(self.codec, chunked)
+        try:
+            self.wfile.write(encoder.begin())
+            for page in stream:
+                self.wfile.write(encoder.encode(page))
+            self.wfile.write(encoder.end())
+        except Exception as e:
+            # status is sent already, broken connection tells the client about the error
+            logging.exception("Unexpected error: %s" % e)
+            self.close_connection = True
+
 
 if __name__ == "__main__":
     op = OptionParser()
     op.add_option("-p", "--port", action="store", type=int, default=8080)
     op.add_option("-l", "--log", action="store", default=None)
+    op.add_option("-w", "--workers", action="store", type=int, default=DEFAULT_WORKERS)
+    op.add_option("-t", "--threads", action="store", type=int, default=DEFAULT_THREADS)
+    op.add_option("--idle-timeout", action="store", type=float, default=IDLE_TIMEOUT)
+    op.add_option("--max-requests", action="store", type=int, default=MAX_KEEPALIVE_REQUESTS)
+    op.add_option("--cache-size", action="store", type=int, default=CACHE_SIZE)
+    op.add_option("--cache-ttl", action="store", type=float, default=CACHE_TTL)
+    op.add_option("--pool-min", action="store", type=int, default=POOL_MIN_SIZE)
+    op.add_option("--pool-max", action="store", type=int, default=POOL_MAX_SIZE)
+    op.add_option("--pool-timeout", action="store", type=float, default=POOL_TIMEOUT)
+    op.add_option("--json-codec", action="store", choices=list(json_codec.CODECS), default=None)
+    op.add_option("--store", action="store", choices=STORES, default=STORES[0])
+    op.add_option("--stream-threshold", action="store", type=int, default=None)
+    op.add_option("--stream-page-size", action="store", type=int, default=STREAM_PAGE_SIZE)
+    op.add_option("--max-body-size", action="store", type=int, default=MAX_BODY_SIZE)
+    op.add_option("--body-timeout", action="store", type=float, default=BODY_TIMEOUT)
+    op.add_option("--log-format", action="store", choices=["json", "text"], default="json")
+    op.add_option("--log-sample", action="store", type=float, default=1.0)
+    op.add_option("--log-max-body", action="store", type=int, default=access_log.LOG_MAX_BODY)
+    op.add_option("--profile-dir", action="store", default=None)
     (opts, args) = op.parse_args()
-    logging.basicConfig(
-        filename=opts.log,
-        level=logging.INFO,
-        format="[%(asctime)s] %(levelname).1s %(message)s",
-        datefmt="%Y.%m.%d %H:%M:%S",
+    setup_logging = functools.partial(
+        access_log.setup_logging, opts.log, opts.log_format, opts.log_sample, opts.log_max_body
+    )
+    listener = setup_logging()
+    MainHTTPHandler.codec = json_codec.get_codec(opts.json_codec)
+    ClientInterestsHandler.stream_threshold = opts.stream_threshold
+    ClientInterestsHandler.page_size = opts.stream_page_size
+    MainHTTPHandler.timeout = opts.idle_timeout
+    MainHTTPHandler.max_requests = opts.max_requests
+    MainHTTPHandler.max_body_size = opts.max_body_size
+    MainHTTPHandler.body_timeout = opts.body_timeout
+    if opts.profile_dir:
+        os.makedirs(opts.profile_dir, exist_ok=True)
+        MainHTTPHandler.profile_dir = opts.profile_dir
+    cache = LocalCache(opts.cache_size, opts.cache_ttl) if opts.cache_size > 0 else None
+    server = ThreadPoolHTTPServer(
+        ("localhost", opts.port),
+        MainHTTPHandler,
+        threads=opts.threads,
+        store_factory=functools.partial(make_store, cache, opts.pool_min, opts.pool_max, opts.pool_timeout, opts.store),
     )
-    server = HTTPServer(("localhost", opts.port), MainHTTPHandler)
     logging.info("Starting server at %s" % opts.port)
-    try:
-        server.serve_forever()
-    except KeyboardInterrupt:
-        pass
+    if opts.workers > 1:
+        serve_prefork(server, opts.workers, setup_logging)
+    else:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
     server.server_close()
+    if cache is not None:
+        logging.info("Local cache stats: %s" % cache.stats())
     logging.info("Stopped server")
+    listener.stop()
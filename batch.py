@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Offline scoring of a JSONL file of method requests, one request
+per line, into a JSONL file of responses in the same order.
+
+    python batch.py -i requests.jsonl -o responses.jsonl --workers 8
+"""
+
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import logging
+from optparse import OptionParser
+import os
+import sys
+import time
+from typing import BinaryIO, Iterable, Iterator, List, Sized, Union
+
+from access_log import LOG_DATE_FORMAT, LOG_FORMAT
+from api import BAD_REQUEST, INTERNAL_ERROR, STORES, InterestsStream, make_response, make_store, method_handler
+import json_codec
+from jsonl_reader import JsonlFile
+
+CHUNK_SIZE = 1000
+# chunks in flight per worker, bounds the memory whatever the file size is
+CHUNKS_PER_WORKER = 2
+# same store for library callers and the command line
+DEFAULT_STORE = STORES[0]
+
+# store, codec and input file of the worker process
+worker_store = None
+worker_codec = None
+worker_reader = None
+
+
+def init_worker(store: str, codec: str = None, path: str = None, offsets: array = None):
+    global worker_store, worker_codec, worker_reader
+    worker_store = make_store(min_size=1, max_size=1, backend=store)
+    worker_codec = json_codec.get_codec(codec)
+    if worker_reader is not None:
+        worker_reader.close()
+    # the index is built by the parent, workers map its file
+    # or get the offsets when it could not be saved
+    worker_reader = JsonlFile(path, offsets=offsets) if path else None
+
+
+def close_worker():
+    global worker_reader
+    if worker_reader is not None:
+        worker_reader.close()
+        worker_reader = None
+
+
+def score_line(line: Union[bytes, memoryview]) -> bytes:
+    try:
+        request = worker_codec.loads(line)
+    except Exception:
+        return worker_codec.dumps(make_response(BAD_REQUEST, None))
+    if not isinstance(request, dict):
+        return worker_codec.dumps(make_response(BAD_REQUEST, None))
+
+    try:
+        response, code = method_handler({"body": request, "headers": {}}, {}, worker_store)
+        if isinstance(response, InterestsStream):
+            response = {cid: interests for page in response for cid, interests in page.items()}
+    except Exception as e:
+        logging.exception("Unexpected error: %s" % e)
+        response, code = None, INTERNAL_ERROR
+    return worker_codec.dumps(make_response(code, response))
+
+
+def score_chunk(lines: Iterable[Union[bytes, memoryview]]) -> bytes:
+    """
+    Responses of a chunk of request lines, one per line
+    """
+    return b"".join(score_line(line) + b"\n" for line in lines)
+
+
+def score_range(lines: range) -> bytes:
+    """
+    Responses of a range of lines of the worker's input file,
+    lines are read from the mapping of the file without copying
+    """
+    return score_chunk(worker_reader.lines(lines.start, lines.stop))
+
+
+def read_chunks(lines: Iterable[bytes], chunk_size=CHUNK_SIZE) -> Iterator[List[bytes]]:
+    chunk = []
+    for line in lines:
+        # blank lines are kept for responses to match the input lines
+        chunk.append(line)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def execute(score, chunks: Iterable[Sized], output: BinaryIO, workers: int, initargs: tuple) -> int:
+    """
+    Score the chunks in a pool of processes and write responses
+    in the input order. Returns the number of the scored lines
+    """
+    workers = workers or os.cpu_count() or 1
+    count = 0
+    if workers == 1:
+        init_worker(*initargs)
+        try:
+            for chunk in chunks:
+                output.write(score(chunk))
+                count += len(chunk)
+        finally:
+            close_worker()
+        return count
+
+    pending = deque()
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=initargs) as executor:
+        for chunk in chunks:
+            if len(pending) >= workers * CHUNKS_PER_WORKER:
+                output.write(pending.popleft().result())
+            pending.append(executor.submit(score, chunk))
+            count += len(chunk)
+        while pending:
+            output.write(pending.popleft().result())
+    return count
+
+
+def run(
+    lines: Iterable[bytes],
+    output: BinaryIO,
+    workers: int = None,
+    chunk_size=CHUNK_SIZE,
+    store: str = DEFAULT_STORE,
+    codec: str = None,
+) -> int:
+    """
+    Score request lines of a stream, the lines are sent to the workers
+    """
+    return execute(score_chunk, read_chunks(lines, chunk_size), output, workers, (store, codec))
+
+
+def run_file(
+    path: str,
+    output: BinaryIO,
+    workers: int = None,
+    chunk_size=CHUNK_SIZE,
+    store: str = DEFAULT_STORE,
+    codec: str = None,
+) -> int:
+    """
+    Score request lines of a file, workers get ranges of line numbers
+    and read the lines from their own mapping of the file
+    """
+    with JsonlFile(path) as reader:
+        count = len(reader)
+        offsets = None if reader.persisted else reader.offsets
+    chunks = (range(start, min(start + chunk_size, count)) for start in range(0, count, chunk_size))
+    return execute(score_range, chunks, output, workers, (store, codec, path, offsets))
+
+
+if __name__ == "__main__":
+    op = OptionParser()
+    op.add_option("-i", "--input", action="store", default="-")
+    op.add_option("-o", "--output", action="store", default="-")
+    op.add_option("-l", "--log", action="store", default=None)
+    op.add_option("-w", "--workers", action="store", type=int, default=None)
+    op.add_option("--chunk-size", action="store", type=int, default=CHUNK_SIZE)
+    op.add_option("--store", action="store", choices=STORES, default=DEFAULT_STORE)
+    op.add_option("--json-codec", action="store", choices=list(json_codec.CODECS), default=None)
+    (opts, args) = op.parse_args()
+    logging.basicConfig(filename=opts.log, level=logging.INFO, format=LOG_FORMAT, datefmt=LOG_DATE_FORMAT)
+
+    target = sys.stdout.buffer if opts.output == "-" else open(opts.output, "wb")
+    started = time.monotonic()
+    try:
+        with target:
+            if opts.input == "-":
+                count = run(sys.stdin.buffer, target, opts.workers, opts.chunk_size, opts.store, opts.json_codec)
+            else:
+                count = run_file(opts.input, target, opts.workers, opts.chunk_size, opts.store, opts.json_codec)
+    except KeyboardInterrupt:
+        sys.exit(1)
+    elapsed = time.monotonic() - started
+    logging.info("Scored %s requests in %.3fs, %.1f requests/s" % (count, elapsed, count / elapsed if elapsed else 0))
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Load benchmark of the scoring api: replays seed requests against
+method_handler in-process or against a running server over HTTP.
+
+    python -m benchmarks.load -n 10000 -c 8
+    python -m benchmarks.load -n 10000 -c 8 --url http://localhost:8080/method/
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import http.client
+import itertools
+import json
+import math
+from optparse import OptionParser
+import os
+import time
+from typing import Any, Dict, List, Tuple
+from urllib.parse import urlsplit
+import uuid
+
+import api
+import json_codec
+from jsonl_reader import JsonlFile
+from storage import InMemoryStorage
+
+SEEDS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "seeds.jsonl")
+DEFAULT_REQUESTS = 10000
+DEFAULT_CONCURRENCY = 8
+PERCENTILES = (50, 95, 99)
+
+
+def sign(request: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Seeds carry no tokens, the admin token changes every hour
+    """
+    if "token" not in request:
+        if request.get("login") == api.ADMIN_LOGIN:
+            token = api.admin_token()
+        else:
+            token = api.get_user_token(request.get("account", ""), request.get("login", ""))
+        request = dict(request, token=token.decode("ascii"))
+    return request
+
+
+def load_seeds(path: str = SEEDS, shard: Tuple[int, int] = (0, 1)) -> List[Dict[str, Any]]:
+    """
+    Seed requests of the shard number out of count shards of the file,
+    so that a large replay file can be split between load generators.
+    User requests are signed here, admin ones are signed on sending
+    """
+    codec = json_codec.get_codec()
+    with JsonlFile(path) as reader:
+        start, stop = reader.shard(*shard)
+        seeds = [codec.loads(line) for line in reader.lines(start, stop) if line.nbytes]
+    seeds = [seed if seed.get("login") == api.ADMIN_LOGIN else sign(seed) for seed in seeds]
+    if not seeds:
+        raise ValueError("No seed requests in {}".format(path))
+    return seeds
+
+
+def percentile(latencies: List[float], p: float) -> float:
+    """
+    Nearest-rank percentile of sorted latencies
+    """
+    if not latencies:
+        return 0.0
+    rank = max(math.ceil(p / 100.0 * len(latencies)), 1)
+    return latencies[rank - 1]
+
+
+class InProcessClient:
+    """
+    Calls method_handler directly, measures the api without HTTP
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def __call__(self, request: Dict[str, Any]) -> int:
+        context = {"request_id": uuid.uuid4().hex}
+        response, code = api.method_handler({"body": request, "headers": {}}, context, self.store)
+        if isinstance(response, api.InterestsStream):
+            for _ in response:
+                pass
+        return code
+
+    def close(self):
+        pass
+
+
+class HTTPClient:
+    """
+    Posts requests over a keep-alive connection of its own
+    """
+
+    def __init__(self, url: str, timeout=10):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.path = parts.path or "/"
+        self.timeout = timeout
+        self.connection = None
+
+    def __call__(self, request: Dict[str, Any]) -> int:
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            self.connection.request("POST", self.path, json.dumps(request), {"Content-Type": "application/json"})
+            response = self.connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            self.close()
+            raise
+        if response.will_close:
+            self.close()
+        return response.status
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+def run(client_factory, seeds: List[Dict[str, Any]], requests: int, concurrency: int) -> Dict[str, Any]:
+    """
+    Send the requests from concurrent workers, each with a client
+    of its own, and gather the latencies and the response codes
+    """
+    counter = itertools.count()
+
+    def worker() -> List[Tuple[float, int]]:
+        client = client_factory()
+        results = []
+        try:
+            for i in counter:
+                if i >= requests:
+                    break
+                # admin token changes every hour, so the runs crossing the hour stay signed
+                request = sign(seeds[i % len(seeds)])
+                started = time.perf_counter()
+                try:
+                    code = client(request)
+                except Exception:
+                    code = None
+                results.append((time.perf_counter() - started, code))
+        finally:
+            client.close()
+        return results
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(worker) for _ in range(concurrency)]
+        results = [result for future in futures for result in future.result()]
+    elapsed = time.perf_counter() - started
+    return summarize(results, elapsed)
+
+
+def summarize(results: List[Tuple[float, int]], elapsed: float) -> Dict[str, Any]:
+    latencies = sorted(latency for latency, _ in results)
+    codes = {}
+    for _, code in results:
+        codes[code] = codes.get(code, 0) + 1
+    summary = {
+        "requests": len(results),
+        "elapsed": elapsed,
+        "throughput": len(results) / elapsed if elapsed else 0.0,
+        "codes": codes,
+    }
+    for p in PERCENTILES:
+        summary["p%s" % p] = percentile(latencies, p)
+    return summary
+
+
+def format_summary(summary: Dict[str, Any]) -> str:
+    lines = [
+        "requests: {requests}, elapsed: {elapsed:.3f}s, throughput: {throughput:.1f} req/s".format(**summary),
+        "latency: " + ", ".join("p{}={:.3f}ms".format(p, summary["p%s" % p] * 1000) for p in PERCENTILES),
+        "codes: " + ", ".join("{}={}".format(code, n) for code, n in sorted(summary["codes"].items(), key=str)),
+    ]
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    op = OptionParser()
+    op.add_option("-n", "--requests", action="store", type=int, default=DEFAULT_REQUESTS)
+    op.add_option("-c", "--concurrency", action="store", type=int, default=DEFAULT_CONCURRENCY)
+    op.add_option("-s", "--seeds", action="store", default=SEEDS)
+    op.add_option("--shard", action="store", default="0/1")
+    op.add_option("-u", "--url", action="store", default=None)
+    op.add_option("--warmup", action="store", type=int, default=100)
+    op.add_option("--store-latency", action="store", type=float, default=0.0)
+    op.add_option("--json", action="store_true", default=False)
+    (opts, args) = op.parse_args()
+
+    number, count = opts.shard.split("/")
+    seeds = load_seeds(opts.seeds, (int(number), int(count)))
+    if opts.url:
+        client_factory = lambda: HTTPClient(opts.url)
+    else:
+        store = InMemoryStorage(latency=opts.store_latency)
+        client_factory = lambda: InProcessClient(store)
+
+    if opts.warmup:
+        run(client_factory, seeds, opts.warmup, opts.concurrency)
+    summary = run(client_factory, seeds, opts.requests, opts.concurrency)
+    if opts.json:
+        print(json.dumps(dict(summary, codes={str(k): v for k, v in summary["codes"].items()})))
+    else:
+        print(format_summary(summary))
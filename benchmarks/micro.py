@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmarks of field validation, request parsing and scoring.
+Reports time per call, memory blocks allocated by a call and its peak
+memory, compares time and blocks with a saved baseline when it is given.
+
+    python -m benchmarks.micro --save baseline.json
+    python -m benchmarks.micro --compare baseline.json --threshold 0.2
+"""
+
+import gc
+import json
+from optparse import OptionParser
+import sys
+import timeit
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+import api
+import scoring
+from benchmarks.load import sign
+from storage import InMemoryStorage
+
+DEFAULT_REPEAT = 5
+DEFAULT_THRESHOLD = 0.2
+DEFAULT_RETRIES = 2
+# blocks a benchmark may allocate above the baseline whatever the threshold,
+# so that a baseline of a few blocks or none is not failed by noise
+ALLOCATIONS_FLOOR = 2
+# compared with the baseline, peak memory is reported only
+COMPARED = ("time", "allocations")
+
+SCORE_ARGUMENTS = {
+    "phone": "79175002040",
+    "email": "stupnikov@otus.ru",
+    "first_name": "Стансилав",
+    "last_name": "Ступников",
+    "birthday": "01.01.1990",
+    "gender": 1,
+}
+INTERESTS_ARGUMENTS = {"client_ids": list(range(100)), "date": "20.07.2017"}
+METHOD_REQUEST = sign(
+    {"account": "horns&hoofs", "login": "h&f", "method": "online_score", "arguments": SCORE_ARGUMENTS}
+)
+# valid values of every field type
+FIELD_VALUES = [
+    (api.OnlineScoreHandler, "first_name", "Стансилав"),
+    (api.OnlineScoreHandler, "email", "stupnikov@otus.ru"),
+    (api.OnlineScoreHandler, "phone", "79175002040"),
+    (api.OnlineScoreHandler, "birthday", "01.01.1990"),
+    (api.OnlineScoreHandler, "gender", 1),
+    (api.ClientInterestsHandler, "client_ids", INTERESTS_ARGUMENTS["client_ids"]),
+    (api.ClientInterestsHandler, "date", "20.07.2017"),
+    (api.MethodRequest, "arguments", SCORE_ARGUMENTS),
+    (api.OnlineScoreBatchHandler, "items", [SCORE_ARGUMENTS] * 10),
+]
+
+
+def field_benchmark(handler, name: str, value: Any) -> Callable[[], Any]:
+    field = dict(handler._fields)[name]
+    return lambda: field.clean(value)
+
+
+def make_benchmarks() -> Dict[str, Callable[[], Any]]:
+    benchmarks = {}
+    for handler, name, value in FIELD_VALUES:
+        benchmarks[type(dict(handler._fields)[name]).__name__] = field_benchmark(handler, name, value)
+
+    def online_score():
+        method = api.OnlineScoreHandler(SCORE_ARGUMENTS)
+        method.validate()
+
+    def clients_interests():
+        method = api.ClientInterestsHandler(INTERESTS_ARGUMENTS)
+        method.validate()
+
+    store = InMemoryStorage()
+    benchmarks.update(
+        {
+            "MethodRequest": lambda: api.MethodRequest(METHOD_REQUEST),
+            "OnlineScoreHandler": online_score,
+            "ClientInterestsHandler": clients_interests,
+            "check_auth": lambda: api.check_auth(api.MethodRequest(METHOD_REQUEST)),
+            "get_score": lambda: scoring.get_score(None, **SCORE_ARGUMENTS),
+            "get_score_cached": lambda: scoring.get_score(store, **SCORE_ARGUMENTS),
+            "method_handler": lambda: api.method_handler({"body": METHOD_REQUEST, "headers": {}}, {}, store),
+        }
+    )
+    return benchmarks
+
+
+def measure_time(f: Callable[[], Any], repeat=DEFAULT_REPEAT, number: int = None) -> float:
+    """
+    Best time per call of the repeats, the minimum is the least noisy.
+    Number of calls of a repeat is picked by timeit unless it is given
+    """
+    timer = timeit.Timer(f)
+    if number is None:
+        number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number
+
+
+def measure_memory(f: Callable[[], Any]) -> int:
+    """
+    Peak of the memory allocated by a single warm call, in bytes
+    """
+    f()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        f()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak - current
+
+
+def measure_allocations(f: Callable[[], Any]) -> int:
+    """
+    Number of memory blocks allocated by a single warm call
+    and still alive after it, along with its result
+    """
+    f()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        result = f()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    del result
+    # the first snapshot is allocated while tracing
+    exclude = (tracemalloc.Filter(False, tracemalloc.__file__),)
+    statistics = after.filter_traces(exclude).compare_to(before.filter_traces(exclude), "filename")
+    return sum(statistic.count_diff for statistic in statistics)
+
+
+def run(benchmarks: Dict[str, Callable[[], Any]], repeat=DEFAULT_REPEAT, number: int = None) -> Dict[str, Dict]:
+    results = {}
+    for name, f in benchmarks.items():
+        results[name] = {
+            "time": measure_time(f, repeat, number),
+            "allocations": measure_allocations(f),
+            "memory": measure_memory(f),
+        }
+    return results
+
+
+def is_regression(metric: str, value, base, threshold: float) -> bool:
+    if value <= base * (1 + threshold):
+        return False
+    return metric != "allocations" or value - base > ALLOCATIONS_FLOOR
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold=DEFAULT_THRESHOLD) -> List[str]:
+    """
+    Names and metrics of the benchmarks worse than the baseline by more than the threshold
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        for metric in COMPARED:
+            # baselines saved before a metric was added lack it
+            if metric in base and is_regression(metric, result[metric], base[metric], threshold):
+                regressions.append("{} {}".format(name, metric))
+    return regressions
+
+
+def format_results(results: Dict[str, Dict], baseline: Dict[str, Dict] = None) -> str:
+    lines = ["{:<24} {:>12} {:>10} {:>8} {:>12}".format("benchmark", "time, us", "change", "blocks", "memory, B")]
+    for name, result in results.items():
+        base = (baseline or {}).get(name)
+        change = "{:+.1%}".format(result["time"] / base["time"] - 1) if base else ""
+        lines.append(
+            "{:<24} {:>12.3f} {:>10} {:>8} {:>12}".format(
+                name, result["time"] * 1e6, change, result["allocations"], result["memory"]
+            )
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    op = OptionParser()
+    op.add_option("-r", "--repeat", action="store", type=int, default=DEFAULT_REPEAT)
+    op.add_option("-n", "--number", action="store", type=int, default=None)
+    op.add_option("-k", "--filter", action="store", default=None)
+    op.add_option("--save", action="store", default=None)
+    op.add_option("--compare", action="store", default=None)
+    op.add_option("--threshold", action="store", type=float, default=DEFAULT_THRESHOLD)
+    op.add_option("--retries", action="store", type=int, default=DEFAULT_RETRIES)
+    (opts, args) = op.parse_args()
+
+    benchmarks = make_benchmarks()
+    if opts.filter:
+        benchmarks = {name: f for name, f in benchmarks.items() if opts.filter in name}
+    results = run(benchmarks, opts.repeat, opts.number)
+
+    baseline = None
+    regressions = []
+    if opts.compare:
+        with open(opts.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, opts.threshold)
+        for _ in range(opts.retries):
+            if not regressions:
+                break
+            # a slow run is measured again to tell a regression from noise,
+            # the new run replaces the old one and is judged on its own
+            names = {regression.split()[0] for regression in regressions}
+            rerun = run({name: benchmarks[name] for name in names}, opts.repeat, opts.number)
+            results.update(rerun)
+            regressions = compare(rerun, baseline, opts.threshold)
+
+    print(format_results(results, baseline))
+    if opts.save:
+        with open(opts.save, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if regressions:
+        print("Slower than the baseline by more than {:.0%}: {}".format(opts.threshold, ", ".join(regressions)))
+        sys.exit(1)
@@ -0,0 +1,181 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from api import OnlineScoreHandler
+from scoring import BIRTHDAY_GENDER_WEIGHT, EMAIL_WEIGHT, NAME_WEIGHT, PHONE_WEIGHT
+
+# columns of online_score arguments, in the order of scoring.calc_score
+COLUMNS = ("phone", "email", "birthday", "gender", "first_name", "last_name")
+PAIR_ERROR = "Arguments must have at least one valid pair"
+# values cleaned once per column, unique values past it are cleaned every time
+CLEAN_CACHE_SIZE = 4096
+
+
+def get_size(columns: Sequence[Sequence[Any]]) -> int:
+    sizes = {len(column) for column in columns}
+    if len(sizes) > 1:
+        raise ValueError("Columns must have the same length")
+    return sizes.pop() if sizes else 0
+
+
+def score_columns(
+    phones: Sequence[Any],
+    emails: Sequence[Any],
+    birthdays: Sequence[Any],
+    genders: Sequence[Any],
+    first_names: Sequence[Any],
+    last_names: Sequence[Any],
+    use_numpy: bool = None,
+) -> Sequence[float]:
+    """
+    Scores of all the rows in a single pass over the columns, same as
+    scoring.calc_score of every row. NumPy is used by default for columns
+    given as arrays, converting lists to arrays costs more than it saves.
+    NumPy array is returned when NumPy is used, a list of floats otherwise
+    """
+    columns = (phones, emails, birthdays, genders, first_names, last_names)
+    get_size(columns)
+    if use_numpy is None:
+        use_numpy = numpy is not None and any(isinstance(column, numpy.ndarray) for column in columns)
+    if use_numpy:
+        return score_columns_numpy(*columns)
+    return score_columns_python(*columns)
+
+
+def score_columns_numpy(phones, emails, birthdays, genders, first_names, last_names):
+    phone, email, birthday, gender, first_name, last_name = (
+        get_present(column) for column in (phones, emails, birthdays, genders, first_names, last_names)
+    )
+    return (
+        PHONE_WEIGHT * phone
+        + EMAIL_WEIGHT * email
+        + BIRTHDAY_GENDER_WEIGHT * (birthday & gender)
+        + NAME_WEIGHT * (first_name & last_name)
+    )
+
+
+def get_present(column):
+    """
+    Truthiness of the column values as a boolean array
+    """
+    if isinstance(column, numpy.ndarray) and column.dtype.kind in "biuf":
+        return column != 0
+    # truthiness of object arrays is evaluated in C
+    return numpy.asarray(column, dtype=object).astype(bool)
+
+
+def score_columns_python(phones, emails, birthdays, genders, first_names, last_names) -> List[float]:
+    return [
+        (PHONE_WEIGHT if phone else 0.0)
+        + (EMAIL_WEIGHT if email else 0.0)
+        + (BIRTHDAY_GENDER_WEIGHT if birthday and gender else 0.0)
+        + (NAME_WEIGHT if first_name and last_name else 0.0)
+        for phone, email, birthday, gender, first_name, last_name in zip(
+            phones, emails, birthdays, genders, first_names, last_names
+        )
+    ]
+
+
+def validate_columns(
+    columns: Dict[str, Sequence[Any]], handler=OnlineScoreHandler
+) -> Tuple[Dict[str, List[Any]], List[Optional[str]]]:
+    """
+    Validate the columns with the fields of the handler and the rule
+    of OnlineScoreHandler.validate. Returns the cleaned columns, where
+    values of the invalid rows are None, and the error of every row
+    or None for a valid one. Missing columns are treated as None values,
+    rows of None values only are empty as requests without arguments
+    """
+    size = get_size([columns[name] for name in COLUMNS if name in columns])
+    errors = [[] for _ in range(size)]
+    empty = [True] * size
+    cleaned = {}
+    for name, field in handler._fields:
+        column = columns.get(name)
+        if column is None:
+            cleaned[name] = [None] * size
+            continue
+        values = []
+        for i, (raw, (value, error)) in enumerate(zip(column, map(make_cleaner(field), column))):
+            values.append(value)
+            if raw is not None:
+                empty[i] = False
+            if error is not None:
+                errors[i].append(error)
+        cleaned[name] = values
+
+    has_pair = get_pairs(cleaned)
+    empty_error = "Empty " + handler.__name__ + "."
+    row_errors = []
+    for i, row in enumerate(errors):
+        if empty[i]:
+            row_errors.append(empty_error)
+        elif row:
+            row_errors.append(", ".join(row))
+        elif not has_pair[i]:
+            row_errors.append(PAIR_ERROR)
+        else:
+            row_errors.append(None)
+
+    invalid = [i for i, error in enumerate(row_errors) if error is not None]
+    for values in cleaned.values():
+        for i in invalid:
+            values[i] = None
+    return cleaned, row_errors
+
+
+def make_cleaner(field):
+    """
+    Clean function of the field returning pairs of (value, error).
+    Columns repeat values a lot, so results are kept per value
+    """
+    results = {}
+
+    def clean(value):
+        try:
+            # type is a part of the key as 1 == 1.0 == True
+            key = (value.__class__, value)
+            return results[key]
+        except KeyError:
+            pass
+        except TypeError:
+            return clean_value(field, value)
+        result = clean_value(field, value)
+        if len(results) < CLEAN_CACHE_SIZE:
+            results[key] = result
+        return result
+
+    return clean
+
+
+def clean_value(field, value) -> Tuple[Any, Optional[str]]:
+    try:
+        return field.clean(value), None
+    except ValueError as e:
+        return None, str(e)
+
+
+def get_pairs(cleaned: Dict[str, List[Any]]) -> List[bool]:
+    """
+    Whether a row has one of the pairs of values OnlineScoreHandler requires
+    """
+    return [
+        (phone is not None and email is not None)
+        or (first_name is not None and last_name is not None)
+        or (gender is not None and birthday is not None)
+        for phone, email, birthday, gender, first_name, last_name in zip(*(cleaned[name] for name in COLUMNS))
+    ]
+
+
+def bulk_score(columns: Dict[str, Sequence[Any]], use_numpy: bool = None):
+    """
+    Validate and score the columns of online_score arguments.
+    Returns the scores and the errors of the rows, invalid rows score 0
+    """
+    cleaned, errors = validate_columns(columns)
+    scores = score_columns(*(cleaned[name] for name in COLUMNS), use_numpy=use_numpy)
+    return scores, errors
@@ -1,4 +1,6 @@
 import datetime
+import functools
+import time
 from typing import Any, Dict, List, Union
 
 UNKNOWN = 0
@@ -9,6 +11,50 @@ GENDERS = {
     MALE: "male",
     FEMALE: "female",
 }
+GENDER_VALUES = frozenset(GENDERS)
+INT_TYPES = frozenset((int, bool))
+DATE_FORMAT = "%d.%m.%Y"
+DATE_CACHE_SIZE = 4096
+
+
+@functools.lru_cache(maxsize=DATE_CACHE_SIZE)
+def parse_date(value: str) -> datetime.date:
+    """
+    Parse DD.MM.YYYY date without strptime,
+    other forms strptime accepts are left to it
+    """
+    if (
+        len(value) == 10
+        and value.isascii()
+        and value[2] == "."
+        and value[5] == "."
+        and value[:2].isdigit()
+        and value[3:5].isdigit()
+        and value[6:].isdigit()
+    ):
+        return datetime.date(int(value[6:]), int(value[3:5]), int(value[:2]))
+    return datetime.datetime.strptime(value, DATE_FORMAT).date()
+
+
+class Today:
+    """
+    Today's date cached until the midnight
+    """
+
+    def __init__(self):
+        self.date = None
+        self.expires = 0.0
+
+    def __call__(self) -> datetime.date:
+        if time.time() >= self.expires:
+            date = datetime.date.today()
+            tomorrow = datetime.datetime.combine(date + datetime.timedelta(days=1), datetime.time())
+            self.date = date
+            self.expires = tomorrow.timestamp()
+        return self.date
+
+
+today = Today()
 
 
 class Field:
@@ -16,30 +62,34 @@ class Field:
     Field base class
     """
 
+    __slots__ = ("required", "nullable", "name")
+
     def __init__(self, required=False, nullable=True):
         self.required = required
         self.nullable = nullable
-        self.value = None
         self.name = None
 
     def __set__(self, instance, value):
+        setattr(instance, self.name, self.clean(value))
+
+    def clean(self, value: Any) -> Any:
         try:
             if self.required is True and value is None:
                 raise ValueError("required not set")
             if self.nullable is False and not value:
                 raise ValueError("empty require")
             if self.nullable is True and value is None:
-                setattr(instance, self.name, None)
-                return
-            value = self.validate(value)
+                return None
+            return self.validate(value)
         except ValueError as e:
             raise ValueError("Field {}: {}".format(self.name[1:], str(e))) from e
-        setattr(instance, self.name, value)
 
     def __set_name__(self, obj, name):
         self.name = "_" + name
 
     def __get__(self, instance, cls):
+        if instance is None:
+            return self
         return getattr(instance, self.name)
 
     def validate(self, value: Any) -> bool:
@@ -51,6 +101,8 @@ class CharField(Field):
     Char field
     """
 
+    __slots__ = ()
+
     def validate(self, value: str) -> str:
         if not isinstance(value, str):
             raise ValueError('Field "{}" must be a string'.format(self.name))
@@ -62,17 +114,34 @@ class ArgumentsField(Field):
     Arguments field
     """
 
+    __slots__ = ()
+
     def validate(self, value: Dict[str, Any]) -> Dict[str, Any]:
         if not (isinstance(value, dict)):
             raise ValueError('Field "{}" must be a dict'.format(self.name))
         return value
 
 
+class ArgumentsListField(Field):
+    """
+    Arguments list field
+    """
+
+    __slots__ = ()
+
+    def validate(self, value: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if not isinstance(value, list) or not all(isinstance(i, dict) for i in value):
+            raise ValueError('Field "{}" must be a list of dicts'.format(self.name))
+        return value
+
+
 class EmailField(CharField):
     """
     Email field
     """
 
+    __slots__ = ()
+
     def validate(self, value: str) -> str:
         value = super().validate(value)
         if "@" not in value:
@@ -85,6 +154,8 @@ class PhoneField(Field):
     Phone field
     """
 
+    __slots__ = ()
+
     def validate(self, value: Union[str, int]) -> str:
         if not (isinstance(value, (int, str))):
             raise ValueError("Wrong type")
@@ -99,10 +170,12 @@ class DateField(CharField):
     Date field
     """
 
+    __slots__ = ()
+
     def validate(self, value):
         try:
             value = super().validate(value)
-            date = datetime.datetime.strptime(value, "%d.%m.%Y").date()
+            date = parse_date(value)
             return date
         except ValueError:
             raise ValueError(
@@ -115,11 +188,13 @@ class BirthDayField(DateField):
     Birthday field
     """
 
+    __slots__ = ()
+
     MAX_AGE = 70
 
     def validate(self, value):
         date = super().validate(value)
-        if datetime.date.today().year - date.year > self.MAX_AGE:
+        if today().year - date.year > self.MAX_AGE:
             raise ValueError(
                 'Age more than {} years in field "{}"'.format(self.MAX_AGE, self.name)
             )
@@ -131,14 +206,14 @@ class GenderField(Field):
     Gender field
     """
 
-    def validate(self, val: int) -> int:
-        possible_values = sorted(GENDERS.keys())
-        err = 'Field "{}" must be an integer, one of {}'.format(
-            self.name, ", ".join(str(i) for i in possible_values)
-        )
+    __slots__ = ()
+
+    # built once, formatted with the name on failure only
+    error = 'Field "{}" must be an integer, one of ' + ", ".join(str(i) for i in sorted(GENDERS))
 
-        if not isinstance(val, int) or val not in possible_values:
-            raise ValueError(err)
+    def validate(self, val: int) -> int:
+        if not isinstance(val, int) or val not in GENDER_VALUES:
+            raise ValueError(self.error.format(self.name))
 
         return val
 
@@ -148,13 +223,22 @@ class ClientIDsField(Field):
     Client IDs field
     """
 
+    __slots__ = ()
+
+    error = 'Field "{}" must be a list of positive integers'
+
     def validate(self, val: List[Any]) -> int:
-        err = 'Field "{}" must be a list of positive integers'.format(self.name)
         if not isinstance(val, list) or not val:
-            raise ValueError(err)
+            raise ValueError(self.error.format(self.name))
+
+        # plain ints are checked in C, subclasses of int go the slow way
+        if INT_TYPES.issuperset(map(type, val)):
+            if min(val) < 0:
+                raise ValueError(self.error.format(self.name))
+            return val
 
         for id_ in val:
             if not isinstance(id_, int) or id_ < 0:
-                raise ValueError(err)
+                raise ValueError(self.error.format(self.name))
 
         return val
@@ -0,0 +1,102 @@
+import json
+import re
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+class StdlibCodec:
+    """
+    JSON codec of the standard library
+    """
+
+    name = "json"
+
+    def loads(self, data: Union[bytes, str, memoryview]) -> Any:
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        return json.loads(data)
+
+    def dumps(self, obj: Any) -> bytes:
+        return json.dumps(obj).encode("utf-8")
+
+
+# numbers orjson may not fit in 64 bits and parse as floats
+LONG_NUMBER = re.compile(rb"[0-9]{20}")
+
+
+class OrjsonCodec:
+    """
+    orjson codec, works with bytes and memoryview natively.
+    Whatever orjson handles differently, integers past 64 bits, NaN
+    and errors of the input, goes to the stdlib codec to behave the same
+    """
+
+    name = "orjson"
+    fallback = StdlibCodec()
+
+    def loads(self, data: Union[bytes, str, memoryview]) -> Any:
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        if LONG_NUMBER.search(data):
+            return self.fallback.loads(data)
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            return self.fallback.loads(data)
+
+    def dumps(self, obj: Any) -> bytes:
+        try:
+            # interests are keyed by integer client ids
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            return self.fallback.dumps(obj)
+
+
+class UjsonCodec:
+    """
+    ujson codec, falls back to the stdlib codec like OrjsonCodec
+    """
+
+    name = "ujson"
+    fallback = StdlibCodec()
+
+    def loads(self, data: Union[bytes, str, memoryview]) -> Any:
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        try:
+            return ujson.loads(data)
+        except ValueError:
+            return self.fallback.loads(data)
+
+    def dumps(self, obj: Any) -> bytes:
+        try:
+            return ujson.dumps(obj, ensure_ascii=False).encode("utf-8")
+        except (OverflowError, TypeError):
+            return self.fallback.dumps(obj)
+
+
+CODECS = {
+    OrjsonCodec.name: OrjsonCodec if orjson is not None else None,
+    UjsonCodec.name: UjsonCodec if ujson is not None else None,
+    StdlibCodec.name: StdlibCodec,
+}
+
+
+def get_codec(name: str = None):
+    """
+    Codec by name, the fastest installed one by default
+    """
+    if name is None:
+        return next(codec() for codec in CODECS.values() if codec is not None)
+    if CODECS.get(name) is None:
+        raise ValueError("JSON codec {} is not available".format(name))
+    return CODECS[name]()
@@ -0,0 +1,185 @@
+from array import array
+import contextlib
+from itertools import islice
+import logging
+import mmap
+import os
+from typing import Iterator, Optional, Tuple
+
+INDEX_SUFFIX = ".idx"
+# size and modification time of the indexed file and the number
+# of the lines precede the offsets
+INDEX_HEADER = 3
+INDEX_ITEM_SIZE = array("Q").itemsize
+INDEX_HEADER_SIZE = INDEX_HEADER * INDEX_ITEM_SIZE
+
+
+class JsonlFile:
+    """
+    Memory-mapped JSONL file read as memoryview slices of its lines,
+    without newlines and without copying. Line offsets are indexed
+    once and persisted next to the file for random access and sharding.
+    Slices must be released before the file is closed
+    """
+
+    def __init__(self, path: str, index_path: str = None, offsets: array = None):
+        self.path = path
+        self.index_path = index_path or path + INDEX_SUFFIX
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            self.size = stat.st_size
+            self.mtime = stat.st_mtime_ns
+            # empty file cannot be mapped
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+        self.view = memoryview(self.mmap) if self.mmap is not None else memoryview(b"")
+        self.index_mmap = None
+        # offsets of an index that could not be saved are given by the opener
+        self.offsets = offsets
+        self.persisted = False
+        if self.offsets is None:
+            self.offsets = self.load_index()
+            self.persisted = self.offsets is not None
+        if self.offsets is None:
+            self.offsets = self.build_index()
+            self.persisted = self.save_index()
+
+    def build_index(self) -> array:
+        """
+        Start offsets of the lines, a blank last line is not a line
+        """
+        offsets = array("Q")
+        if self.mmap is None:
+            return offsets
+        find = self.mmap.find
+        start = 0
+        while start < self.size:
+            offsets.append(start)
+            end = find(b"\n", start)
+            if end < 0:
+                break
+            start = end + 1
+        return offsets
+
+    def load_index(self) -> Optional[memoryview]:
+        """
+        Offsets of the index file mapped to memory, so processes reading
+        the same file share the pages of the index instead of copying it
+        """
+        try:
+            with open(self.index_path, "rb") as f:
+                index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            # missing or empty index
+            return None
+        view = memoryview(index)
+        if len(view) < INDEX_HEADER_SIZE or len(view) % INDEX_ITEM_SIZE:
+            return self.discard_index(index, view)
+        header = view[:INDEX_HEADER_SIZE].cast("Q")
+        size, mtime, count = header
+        header.release()
+        # an index written partly has fewer offsets than lines
+        if (size, mtime) != (self.size, self.mtime) or len(view) != INDEX_HEADER_SIZE + count * INDEX_ITEM_SIZE:
+            return self.discard_index(index, view)
+        self.index_mmap = index
+        offsets = view[INDEX_HEADER_SIZE:].cast("Q")
+        view.release()
+        return offsets
+
+    @staticmethod
+    def discard_index(index: mmap.mmap, view: memoryview):
+        view.release()
+        index.close()
+        return None
+
+    def save_index(self) -> bool:
+        """
+        Write the index to a temporary file replacing the index once
+        it is complete, so that readers never see a part of it
+        """
+        index = array("Q", (self.size, self.mtime, len(self.offsets)))
+        index.extend(self.offsets)
+        # processes indexing the same file write files of their own
+        path = "{}.{}.tmp".format(self.index_path, os.getpid())
+        try:
+            with open(path, "wb") as f:
+                index.tofile(f)
+            os.replace(path, self.index_path)
+        except OSError as e:
+            # read-only location or full disk, the index is built again next time
+            logging.warning("Index save error: %s" % e)
+            with contextlib.suppress(OSError):
+                os.unlink(path)
+            return False
+        return True
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def get_bounds(self, i: int) -> Tuple[int, int]:
+        start = self.offsets[i]
+        if i + 1 < len(self.offsets):
+            # a line but the last ends with the newline before the next one
+            return start, self.offsets[i + 1] - 1
+        end = self.size
+        if end > start and self.view[end - 1] == 0x0A:
+            end -= 1
+        return start, end
+
+    def __getitem__(self, i: int) -> memoryview:
+        if i < 0:
+            i += len(self.offsets)
+        if not 0 <= i < len(self.offsets):
+            raise IndexError("Line index out of range")
+        start, end = self.get_bounds(i)
+        return self.view[start:end]
+
+    def lines(self, start: int = 0, stop: int = None) -> Iterator[memoryview]:
+        stop = len(self.offsets) if stop is None else min(stop, len(self.offsets))
+        if start >= stop:
+            return
+        view = self.view
+        # a view of the mapped index, a copy of the lines of the range for a built one
+        offsets = self.offsets[start:stop]
+        try:
+            for begin, end in zip(offsets, islice(offsets, 1, None)):
+                yield view[begin : end - 1]
+        finally:
+            if isinstance(offsets, memoryview):
+                offsets.release()
+        yield self[stop - 1]
+
+    def __iter__(self) -> Iterator[memoryview]:
+        return self.lines()
+
+    def shard(self, number: int, count: int) -> Tuple[int, int]:
+        """
+        Range of the lines of the shard number out of count shards
+        """
+        if not 0 <= number < count:
+            raise ValueError("Shard {} out of {}".format(number, count))
+        size, rest = divmod(len(self.offsets), count)
+        start = number * size + min(number, rest)
+        return start, start + size + (1 if number < rest else 0)
+
+    def close(self):
+        self.view.release()
+        if self.mmap is not None:
+            try:
+                self.mmap.close()
+            except BufferError:
+                # slices are still alive, the mapping goes with them
+                pass
+        if self.index_mmap is not None:
+            self.offsets.release()
+            try:
+                self.index_mmap.close()
+            except BufferError:
+                # offsets of unfinished lines() are alive
+                pass
+            self.index_mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,139 @@
+import abc
+import bisect
+import contextlib
+import threading
+import time
+from typing import Dict, List, Tuple
+
+# seconds, fine-grained below a millisecond where the local calls are
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+REGISTRY: List["Metric"] = []
+
+
+def format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = ['{}="{}"'.format(n, escape(v)) for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metric(abc.ABC):
+    """
+    Base of the metrics, values are kept per tuple of label values.
+    Metrics are registered on creation and are process-wide,
+    so every pre-fork worker reports its own values
+    """
+
+    type = None
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = (), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values: Dict[Tuple[str, ...], object] = {}
+        self.lock = threading.Lock()
+        if registry is not None:
+            registry.append(self)
+
+    def key(self, labels) -> Tuple[str, ...]:
+        if len(labels) != len(self.labels):
+            raise ValueError("Metric {} expects labels {}".format(self.name, self.labels))
+        return tuple(str(label) for label in labels)
+
+    def clear(self):
+        with self.lock:
+            self.values.clear()
+
+    def render(self) -> List[str]:
+        lines = [
+            "# HELP {} {}".format(self.name, self.documentation),
+            "# TYPE {} {}".format(self.name, self.type),
+        ]
+        with self.lock:
+            # histogram states are mutated in place
+            values = [(k, v[:] if isinstance(v, list) else v) for k, v in sorted(self.values.items())]
+        for labels, value in values:
+            lines.extend(self.render_value(labels, value))
+        return lines
+
+    @abc.abstractmethod
+    def render_value(self, labels: Tuple[str, ...], value) -> List[str]:
+        """
+        Sample lines of the value of the labels
+        """
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, *labels, amount=1):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, *labels):
+        return self.values.get(self.key(labels), 0)
+
+    def render_value(self, labels, value):
+        return ["{}{} {}".format(self.name, format_labels(self.labels, labels), value)]
+
+
+class Histogram(Metric):
+    """
+    Histogram of observed values, buckets are cumulative on rendering only
+    """
+
+    type = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS, registry=REGISTRY):
+        super().__init__(name, documentation, labels, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels):
+        key = self.key(labels)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                # per bucket counts with +Inf last, then sum
+                state = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[bisect.bisect_left(self.buckets, value)] += 1
+            state[-1] += value
+
+    @contextlib.contextmanager
+    def time(self, *labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def get_count(self, *labels) -> int:
+        state = self.values.get(self.key(labels))
+        return sum(state[:-1]) if state else 0
+
+    def render_value(self, labels, state):
+        lines = []
+        count = 0
+        for bound, n in zip(self.buckets + ("+Inf",), state):
+            count += n
+            le = 'le="{}"'.format(bound)
+            lines.append("{}_bucket{} {}".format(self.name, format_labels(self.labels, labels, le), count))
+        lines.append("{}_sum{} {}".format(self.name, format_labels(self.labels, labels), state[-1]))
+        lines.append("{}_count{} {}".format(self.name, format_labels(self.labels, labels), count))
+        return lines
+
+
+def render(registry=REGISTRY) -> bytes:
+    """
+    Metrics of the registry in Prometheus text exposition format
+    """
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return ("\n".join(lines) + "\n").encode("utf-8")
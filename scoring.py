@@ -1,5 +1,68 @@
+import hashlib
+import json
+import logging
 import random
-from typing import List, Any, Dict
+from typing import List, Any, Dict, Optional
+
+SCORE_CACHE_TTL = 60 * 60
+PHONE_WEIGHT = 1.5
+EMAIL_WEIGHT = 1.5
+BIRTHDAY_GENDER_WEIGHT = 1.5
+NAME_WEIGHT = 0.5
+INTERESTS = [
+    "cars",
+    "pets",
+    "travel",
+    "hi-tech",
+    "sport",
+    "music",
+    "books",
+    "tv",
+    "cinema",
+    "geek",
+    "otus",
+]
+
+
+def get_score_key(
+    phone: str,
+    email: str,
+    birthday: Any = None,
+    gender: int = None,
+    first_name: str = None,
+    last_name: str = None,
+) -> str:
+    key_parts = [
+        str(phone) if phone else "",
+        email or "",
+        str(birthday) if birthday else "",
+        str(gender) if gender is not None else "",
+        first_name or "",
+        last_name or "",
+    ]
+    return "uid:" + hashlib.md5("|".join(key_parts).encode("utf-8")).hexdigest()
+
+
+def cache_get(store, key: str) -> Optional[Any]:
+    """
+    Cache is optional, so the store failing opens to a cache miss
+    """
+    if not store:
+        return None
+    try:
+        return store.cache_get(key)
+    except Exception as e:
+        logging.warning("Cache get error: %s" % e)
+        return None
+
+
+def cache_set(store, key: str, value: Any, expire: int):
+    if not store:
+        return
+    try:
+        store.cache_set(key, value, expire)
+    except Exception as e:
+        logging.warning("Cache set error: %s" % e)
 
 
 def get_score(
@@ -11,30 +74,108 @@ def get_score(
     first_name: str = None,
     last_name: str = None,
 ):
+    key = get_score_key(phone, email, birthday, gender, first_name, last_name)
+    score = cache_get(store, key)
+    if score is not None:
+        return float(score)
+
+    score = calc_score(phone, email, birthday, gender, first_name, last_name)
+    cache_set(store, key, score, SCORE_CACHE_TTL)
+    return score
+
+
+def calc_score(
+    phone: str,
+    email: str,
+    birthday: Any = None,
+    gender: int = None,
+    first_name: str = None,
+    last_name: str = None,
+) -> float:
     score = 0
     if phone:
-        score += 1.5
+        score += PHONE_WEIGHT
     if email:
-        score += 1.5
+        score += EMAIL_WEIGHT
     if birthday and gender:
-        score += 1.5
+        score += BIRTHDAY_GENDER_WEIGHT
     if first_name and last_name:
-        score += 0.5
+        score += NAME_WEIGHT
     return score
 
 
 def get_interests(store: Dict[str, str], cid: int) -> List[str]:
-    interests = [
-        "cars",
-        "pets",
-        "travel",
-        "hi-tech",
-        "sport",
-        "music",
-        "books",
-        "tv",
-        "cinema",
-        "geek",
-        "otus",
-    ]
-    return random.sample(interests, 2)
+    return get_interests_many(store, [cid])[cid]
+
+
+def get_interests_many(store, cids: List[int]) -> Dict[int, List[str]]:
+    """
+    Fetch interests of all the clients in a single store round-trip
+    """
+    keys = get_interests_keys(cids)
+    stored = store.get_many(list(keys.values())) if store else {}
+    return load_interests_many(keys, stored)
+
+
+def get_interests_key(cid: int) -> str:
+    return "i:%s" % cid
+
+
+def get_interests_keys(cids: List[int]) -> Dict[int, str]:
+    # repeated ids are fetched once
+    return {cid: get_interests_key(cid) for cid in cids}
+
+
+def load_interests_many(keys: Dict[int, str], stored: Dict[str, str]) -> Dict[int, List[str]]:
+    return {cid: load_interests(stored.get(key)) for cid, key in keys.items()}
+
+
+def load_interests(value: Optional[str]) -> List[str]:
+    # interests not stored yet are sampled
+    if value is None:
+        return random.sample(INTERESTS, 2)
+    return json.loads(value)
+
+
+async def cache_get_async(store, key: str) -> Optional[Any]:
+    if not store:
+        return None
+    try:
+        return await store.cache_get(key)
+    except Exception as e:
+        logging.warning("Cache get error: %s" % e)
+        return None
+
+
+async def cache_set_async(store, key: str, value: Any, expire: int):
+    if not store:
+        return
+    try:
+        await store.cache_set(key, value, expire)
+    except Exception as e:
+        logging.warning("Cache set error: %s" % e)
+
+
+async def get_score_async(
+    store,
+    phone: str,
+    email: str,
+    birthday: Any = None,
+    gender: int = None,
+    first_name: str = None,
+    last_name: str = None,
+):
+    key = get_score_key(phone, email, birthday, gender, first_name, last_name)
+    score = await cache_get_async(store, key)
+    if score is not None:
+        return float(score)
+
+    score = calc_score(phone, email, birthday, gender, first_name, last_name)
+    await cache_set_async(store, key, score, SCORE_CACHE_TTL)
+    return score
+
+
+async def get_interests_many_async(store, cids: List[int]) -> Dict[int, List[str]]:
+    keys = get_interests_keys(cids)
+    stored = await store.get_many(list(keys.values())) if store else {}
+    return load_interests_many(keys, stored)
@@ -1,34 +1,182 @@
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import contextlib
 import functools
-import json
+import logging
+import queue
 import random
 import tarantool
+import threading
 import time
+from typing import Any, Optional, Tuple
+
+import metrics
 
 
 MIN_TIMEOUT = 0.1
 MAX_TIMEOUT = 15 * 60
 TIMEOUT_FACTOR = 2
 TIMEOUT_JITTER = 0.1
-ATTEMPTS = 20
+DEADLINE = 30
+BREAKER_THRESHOLD = 5
+BREAKER_RESET_TIMEOUT = 10
+RETRY_ERRORS = (TimeoutError, ConnectionError)
+RAISE = object()
+GET_MANY = """
+local space_no, keys = ...
+local rows = {}
+for _, key in ipairs(keys) do
+    local row = box.space[space_no]:get(key)
+    if row ~= nil then
+        table.insert(rows, row)
+    end
+end
+return rows
+"""
+# the row may have been refreshed since it was read expired
+DELETE_EXPIRED = """
+local space_no, key, now = ...
+local row = box.space[space_no]:get(key)
+if row ~= nil and row[3] ~= nil and row[3] <= now then
+    box.space[space_no]:delete(key)
+end
+"""
+ASYNC_WORKERS = 32
+CACHE_SIZE = 10000
+CACHE_TTL = 60
+POOL_MIN_SIZE = 1
+POOL_MAX_SIZE = 16
+POOL_TIMEOUT = 3
+POOL_CHECK_INTERVAL = 30
+
+STORE_LATENCY = metrics.Histogram("scoring_store_duration_seconds", "Storage round-trip time", ("operation",))
+STORE_ERRORS = metrics.Counter("scoring_store_errors_total", "Failed storage calls", ("operation",))
+
+
+class CircuitBreaker:
+    """
+    Short-circuits calls while the store is down: opens after a number
+    of consecutive failures and lets a trial call through after timeout
+    """
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT, timer=time.monotonic):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.timer = timer
+        self.failures = 0
+        self.opened = None
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.opened is None:
+                return True
+            if self.timer() - self.opened >= self.reset_timeout:
+                # half-open, a single trial call per timeout is let through,
+                # its success closes the breaker and its failure opens it again
+                self.opened = self.timer()
+                self.failures = self.threshold - 1
+                return True
+            return False
+
+    def success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened = None
 
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.opened = self.timer()
+
+
+class StorageUnavailable(ConnectionError):
+    """
+    Call short-circuited by the open breaker, the connection was not used
+    """
+
+
+class RetryPolicy:
+    """
+    Decorator retrying connection failures with exponential backoff,
+    bounded by a number of attempts and a deadline of the retries,
+    every attempt is bounded by the socket timeout of the connection.
+    Returns the fallback value instead of raising when it is given
+    """
+
+    def __init__(
+        self,
+        attempts: int,
+        deadline=DEADLINE,
+        breaker: CircuitBreaker = None,
+        fallback=RAISE,
+        timer=time.monotonic,
+    ):
+        self.attempts = attempts
+        self.deadline = deadline
+        self.breaker = breaker
+        self.fallback = fallback
+        self.timer = timer
 
-def retrys(attempts):
-    def decorator(f, *args, **kwargs):
+    def __call__(self, f):
         @functools.wraps(f)
         def wrapper(*args, **kwargs):
-            delay = MIN_TIMEOUT
-            for i in range(attempts):
+            delays = self.delays()
+            while True:
+                if self.breaker is not None and not self.breaker.allow():
+                    return self.fail(StorageUnavailable("Storage is unavailable"))
                 try:
-                    return f(*args, **kwargs)
-                except (TimeoutError, ConnectionError) as e:
+                    result = f(*args, **kwargs)
+                except RETRY_ERRORS as e:
+                    delay = self.on_error(delays)
+                    if delay is None:
+                        return self.fail(e)
                     time.sleep(delay)
-                    delay = min(delay * TIMEOUT_FACTOR, MAX_TIMEOUT)
-                    delay = max(random.gauss(delay, TIMEOUT_JITTER), MIN_TIMEOUT)
-            raise ConnectionError("Connection failed after {} attempts".format(attempts))
+                else:
+                    if self.breaker is not None:
+                        self.breaker.success()
+                    return result
 
         return wrapper
 
-    return decorator
+    def delays(self):
+        """
+        Generate delays before the next attempts fitting in the deadline
+        """
+        deadline = self.timer() + self.deadline
+        delay = MIN_TIMEOUT
+        for _ in range(self.attempts - 1):
+            if self.timer() + delay > deadline:
+                return
+            yield delay
+            delay = min(delay * TIMEOUT_FACTOR, MAX_TIMEOUT)
+            delay = max(random.gauss(delay, TIMEOUT_JITTER), MIN_TIMEOUT)
+
+    def on_error(self, delays):
+        if self.breaker is not None:
+            self.breaker.failure()
+        return next(delays, None)
+
+    def fail(self, error):
+        if self.fallback is not RAISE:
+            return self.fallback
+        if isinstance(error, StorageUnavailable):
+            raise error
+        raise ConnectionError("Connection failed: {}".format(error))
+
+
+# budgets of the calls, cache is optional and fails fast
+STORAGE_BREAKER = CircuitBreaker()
+CONNECT_RETRY = RetryPolicy(attempts=3, deadline=5)
+STORE_RETRY = RetryPolicy(attempts=3, deadline=2, breaker=STORAGE_BREAKER)
+CACHE_RETRY = RetryPolicy(attempts=1, deadline=0, breaker=STORAGE_BREAKER)
+# cache failures fall back to a miss above the pool,
+# so that the pool sees them and checks the connection
+CACHE_GET_FALLBACK = RetryPolicy(attempts=1, deadline=0, fallback=None)
+CACHE_GET_TTL_FALLBACK = RetryPolicy(attempts=1, deadline=0, fallback=(None, None))
+CACHE_SET_FALLBACK = RetryPolicy(attempts=1, deadline=0, fallback=False)
 
 
 class TarantoolConnection:
@@ -47,32 +195,452 @@ class TarantoolConnection:
         self.password = password
         self.connection = None
 
-    @retrys(ATTEMPTS)
+    @CONNECT_RETRY
     def get_connection(self):
-        connection = tarantool.connect(self.host, self.port, self.user, self.password)
+        try:
+            # the driver neither waits without a limit nor reconnects on its own,
+            # retries are up to the policies of the calls
+            connection = tarantool.Connection(
+                self.host,
+                self.port,
+                user=self.user,
+                password=self.password,
+                socket_timeout=self.timeout,
+                connection_timeout=self.timeout,
+                reconnect_max_attempts=0,
+                reconnect_delay=0,
+            )
+        except tarantool.error.NetworkError as e:
+            raise ConnectionError(e) from e
         return connection.space(0)
 
-    @retrys(ATTEMPTS)
-    def get(self, key):
+    def ping(self) -> bool:
         try:
-            value = self.connection.select(key)
-            if value is not None:
-                return value
+            self.connection.connection.ping(notime=True)
+            return True
+        except Exception:
+            return False
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.connection.close()
+            self.connection = None
+
+    def execute(self, name, *args):
+        """
+        Call the driver telling network failures, which are retried,
+        from errors of the request
+        """
+        if self.connection is None:
+            raise ConnectionError("Not connected")
+        return self.round_trip(name, getattr(self.connection, name), *args)
+
+    def round_trip(self, operation: str, f, *args):
+        started = time.perf_counter()
+        try:
+            return f(*args)
+        except tarantool.error.NetworkError as e:
+            STORE_ERRORS.inc(operation)
+            raise ConnectionError(e) from e
         except Exception as e:
+            STORE_ERRORS.inc(operation)
             raise ValueError(e)
+        finally:
+            STORE_LATENCY.observe(time.perf_counter() - started, operation)
+
+    @STORE_RETRY
+    def get(self, key):
+        value = self.execute("select", key)
+        if value is not None:
+            return value
+
+    @STORE_RETRY
+    def get_many(self, keys):
+        """
+        Select values of all the keys in a single round-trip
+        """
+        if self.connection is None:
+            raise ConnectionError("Not connected")
+        response = self.round_trip(
+            "eval", self.connection.connection.eval, GET_MANY, (self.connection.space_no, list(keys))
+        )
+        return {row[0]: row[1] for row in response.data[0]}
 
-    @retrys(ATTEMPTS)
     def cache_get(self, key):
-        return self.get(key)
+        return self.cache_get_ttl(key)[0]
 
-    @retrys(ATTEMPTS)
+    @CACHE_RETRY
+    def cache_get_ttl(self, key) -> Tuple[Any, Optional[float]]:
+        """
+        Cached value with the seconds it has left, None for no expiry
+        """
+        rows = self.execute("select", key)
+        if not rows:
+            return None, None
+        row = rows[0]
+        expires = row[2] if len(row) > 2 else None
+        if expires is None:
+            return row[1], None
+        now = time.time()
+        if expires <= now:
+            # server keeps expired rows, the reader that finds one deletes it
+            self.round_trip(
+                "eval", self.connection.connection.eval, DELETE_EXPIRED, (self.connection.space_no, key, now)
+            )
+            return None, None
+        return row[1], expires - now
+
+    @STORE_RETRY
     def set(self, key, value):
+        self.execute("insert", (key, value))
+        return True
+
+    @CACHE_RETRY
+    def cache_set(self, key, value, expire=None):
+        expires = time.time() + expire if expire else None
+        self.execute("replace", (key, value, expires))
+        return True
+
+
+class LocalCache:
+    """
+    Bounded in-process LRU cache with TTL of entries
+    """
+
+    def __init__(self, max_size=CACHE_SIZE, ttl=CACHE_TTL, timer=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.timer = timer
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self.lock:
+            item = self.items.get(key)
+            if item is not None:
+                value, expires = item
+                if expires > self.timer():
+                    self.items.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self.items[key]
+                self.evictions += 1
+            self.misses += 1
+            return None
+
+    def set(self, key, value, expire=None):
+        ttl = min(expire, self.ttl) if expire else self.ttl
+        with self.lock:
+            self.items[key] = (value, self.timer() + ttl)
+            self.items.move_to_end(key)
+            while len(self.items) > self.max_size:
+                self.items.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                "size": len(self.items),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class CachedStorage:
+    """
+    Store serving cache_get/cache_set and get_many from the in-process
+    caches in front of the backing store, other calls go to the backing store.
+    Scores and interests are kept in separate caches, so that they do not
+    evict each other
+    """
+
+    def __init__(self, store, cache: LocalCache, interests: LocalCache = None):
+        self.store = store
+        self.cache = cache
+        self.interests = interests or LocalCache(cache.max_size, cache.ttl, cache.timer)
+
+    def __getattr__(self, name):
+        return getattr(self.store, name)
+
+    def cache_get(self, key):
+        value = self.cache.get(key)
+        if value is None:
+            # local copy must not outlive the backend entry
+            value, ttl = self.store.cache_get_ttl(key)
+            if value is not None:
+                self.cache.set(key, value, ttl)
+        return value
+
+    def cache_set(self, key, value, expire=None):
+        self.cache.set(key, value, expire)
+        return self.store.cache_set(key, value, expire)
+
+    def get_many(self, keys):
+        """
+        Values of the cached keys, the misses are fetched in one call
+        """
+        values = {}
+        misses = []
+        for key in keys:
+            value = self.interests.get(key)
+            if value is None:
+                misses.append(key)
+            else:
+                values[key] = value
+        if misses:
+            fetched = self.store.get_many(misses)
+            for key, value in fetched.items():
+                self.interests.set(key, value)
+            values.update(fetched)
+        return values
+
+
+class TarantoolPool:
+    """
+    Pool of Tarantool connections shared by request threads.
+    Every call checks out a connection for its exclusive use, connections
+    idle for long or failed in the last call are pinged before reuse
+    and replaced when broken, so that at least min_size stay open
+    """
+
+    def __init__(
+        self,
+        connection_factory=TarantoolConnection,
+        min_size=POOL_MIN_SIZE,
+        max_size=POOL_MAX_SIZE,
+        timeout=POOL_TIMEOUT,
+        check_interval=POOL_CHECK_INTERVAL,
+        breaker: CircuitBreaker = STORAGE_BREAKER,
+    ):
+        self.connection_factory = connection_factory
+        self.breaker = breaker
+        self.min_size = min_size
+        self.timeout = timeout
+        self.check_interval = check_interval
+        self.slots = threading.BoundedSemaphore(max_size)
+        self.idle = queue.LifoQueue()
+        # open connections, idle and checked out
+        self.size = 0
+        self.lock = threading.Lock()
         try:
-            self.connection.insert(key, value)
-            return True
+            self.fill()
         except Exception as e:
-            raise ValueError(e)
+            logging.exception("Storage connection error: %s" % e)
+
+    def create(self) -> TarantoolConnection:
+        # connecting to the store that is down does not wait for it
+        if not self.breaker.allow():
+            raise StorageUnavailable("Storage is unavailable")
+        connection = self.connection_factory()
+        try:
+            connection.connection = connection.get_connection()
+        except ConnectionError:
+            self.breaker.failure()
+            raise
+        self.breaker.success()
+        with self.lock:
+            self.size += 1
+        return connection
+
+    def fill(self):
+        """
+        Open idle connections up to the minimal size of the pool
+        """
+        while self.size < self.min_size:
+            self.idle.put((self.create(), time.monotonic()))
+
+    def discard(self, connection: TarantoolConnection):
+        connection.close()
+        with self.lock:
+            self.size -= 1
+        self.fill()
+
+    def acquire(self) -> TarantoolConnection:
+        if not self.slots.acquire(timeout=self.timeout):
+            raise TimeoutError("No free storage connection in {} seconds".format(self.timeout))
+        try:
+            while True:
+                try:
+                    connection, released = self.idle.get_nowait()
+                except queue.Empty:
+                    return self.create()
+                if time.monotonic() - released > self.check_interval and not self.check(connection, released):
+                    # broken connection is replaced by a fresh idle one
+                    self.discard(connection)
+                    continue
+                return connection
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def check(self, connection: TarantoolConnection, released: float) -> bool:
+        """
+        Ping the connection unless the store is known to be down,
+        then it is kept for a check and the call is short-circuited
+        """
+        if not self.breaker.allow():
+            self.idle.put((connection, released))
+            raise StorageUnavailable("Storage is unavailable")
+        if connection.ping():
+            self.breaker.success()
+            return True
+        self.breaker.failure()
+        return False
+
+    def release(self, connection: TarantoolConnection, check=False):
+        # connection to check gets released time in the past
+        self.idle.put((connection, float("-inf") if check else time.monotonic()))
+        self.slots.release()
+
+    @contextlib.contextmanager
+    def connection(self):
+        connection = self.acquire()
+        try:
+            yield connection
+        except StorageUnavailable:
+            # the call did not reach the connection
+            self.release(connection)
+            raise
+        except Exception:
+            self.release(connection, check=True)
+            raise
+        self.release(connection)
+
+    def call(self, name, *args):
+        with self.connection() as connection:
+            return getattr(connection, name)(*args)
+
+    def get(self, key):
+        return self.call("get", key)
+
+    def get_many(self, keys):
+        return self.call("get_many", keys)
+
+    @CACHE_GET_FALLBACK
+    def cache_get(self, key):
+        return self.call("cache_get", key)
+
+    @CACHE_GET_TTL_FALLBACK
+    def cache_get_ttl(self, key):
+        return self.call("cache_get_ttl", key)
+
+    def set(self, key, value):
+        return self.call("set", key, value)
+
+    @CACHE_SET_FALLBACK
+    def cache_set(self, key, value, expire=None):
+        return self.call("cache_set", key, value, expire)
+
+    def close(self):
+        while True:
+            try:
+                connection, _ = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            connection.close()
+            with self.lock:
+                self.size -= 1
+
+
+class InMemoryStorage:
+    """
+    Stand-in for Tarantool keeping values in a dict, for benchmarks
+    and local runs. Latency is slept on every call to simulate
+    the network round-trip
+    """
+
+    def __init__(self, latency=0.0, timer=time.time):
+        self.latency = latency
+        self.timer = timer
+        self.items = {}
+        self.lock = threading.Lock()
+
+    def round_trip(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def get(self, key):
+        self.round_trip()
+        item = self.items.get(key)
+        return item[0] if item is not None else None
+
+    def get_many(self, keys):
+        self.round_trip()
+        items = self.items
+        return {key: items[key][0] for key in keys if key in items}
+
+    def cache_get(self, key):
+        return self.cache_get_ttl(key)[0]
+
+    def cache_get_ttl(self, key):
+        self.round_trip()
+        item = self.items.get(key)
+        if item is None:
+            return None, None
+        value, expires = item
+        if expires is None:
+            return value, None
+        now = self.timer()
+        if expires <= now:
+            with self.lock:
+                if self.items.get(key) is item:
+                    del self.items[key]
+            return None, None
+        return value, expires - now
+
+    def set(self, key, value):
+        self.round_trip()
+        with self.lock:
+            self.items[key] = (value, None)
+        return True
+
+    def cache_set(self, key, value, expire=None):
+        self.round_trip()
+        expires = self.timer() + expire if expire else None
+        with self.lock:
+            self.items[key] = (value, expires)
+        return True
+
+    def close(self):
+        pass
+
+
+class AsyncTarantoolConnection:
+    """
+    Asyncio counterpart of TarantoolConnection.
+    Tarantool driver is blocking, so calls of the store
+    are awaited in a pool of threads
+    """
+
+    def __init__(self, store, max_workers=ASYNC_WORKERS):
+        self.store = store
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="storage")
+
+    def call(self, name, *args):
+        return getattr(self.store, name)(*args)
+
+    async def run(self, name, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.call, name, *args)
+
+    async def get(self, key):
+        return await self.run("get", key)
+
+    async def get_many(self, keys):
+        return await self.run("get_many", keys)
+
+    async def cache_get(self, key):
+        return await self.run("cache_get", key)
+
+    async def set(self, key, value):
+        return await self.run("set", key, value)
+
+    async def cache_set(self, key, value, expire=None):
+        return await self.run("cache_set", key, value, expire)
 
-    @retrys(ATTEMPTS)
-    def cache_set(self, key, value):
-        return self.set(key, value)
+    def close(self):
+        self.executor.shutdown(wait=False)
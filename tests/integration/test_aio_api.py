@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import hashlib
+import json
+import unittest
+
+import aio_api
+import api
+import scoring
+from storage import AsyncTarantoolConnection, InMemoryStorage
+
+
+class AsyncServerMixin:
+    """
+    Async server on the store of make_store, started for every test
+    """
+
+    def make_store(self):
+        return None
+
+    async def asyncSetUp(self):
+        self.store = self.make_store()
+        server = aio_api.AsyncHTTPServer(store=self.store, idle_timeout=1, max_body_size=1024, body_timeout=0.5)
+        self.srv = await asyncio.start_server(server.handle_connection, "localhost", 0)
+        self.port = self.srv.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        self.srv.close()
+        await self.srv.wait_closed()
+        if self.store is not None:
+            self.store.close()
+
+    def get_request(self, method, arguments):
+        request = {"account": "horns&hoofs", "login": "h&f", "method": method, "arguments": arguments}
+        msg = request["account"] + request["login"] + api.SALT
+        request["token"] = hashlib.sha512(msg.encode("utf-8")).hexdigest()
+        return request
+
+    def encode(self, request, path="/method/"):
+        body = json.dumps(request).encode("utf-8")
+        head = "POST {} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {}\r\n\r\n".format(path, len(body))
+        return head.encode("latin-1") + body
+
+    async def read_response(self, reader):
+        head = await reader.readuntil(b"\r\n\r\n")
+        lines = head.decode("latin-1").split("\r\n")
+        status = int(lines[0].split()[1])
+        headers = dict(line.lower().split(": ", 1) for line in lines[1:] if line)
+        body = await reader.readexactly(int(headers["content-length"]))
+        return status, headers, json.loads(body)
+
+
+class TestAsyncHTTPServer(AsyncServerMixin, unittest.IsolatedAsyncioTestCase):
+    async def test_pipelined_requests(self):
+        reader, writer = await asyncio.open_connection("localhost", self.port)
+        score = self.get_request("online_score", {"phone": "79175002040", "email": "stupnikov@otus.ru"})
+        interests = self.get_request("clients_interests", {"client_ids": [1, 2]})
+        writer.write(self.encode(score) + self.encode(interests))
+        await writer.drain()
+
+        status, headers, response = await self.read_response(reader)
+        self.assertEqual(api.OK, status)
+        self.assertEqual("keep-alive", headers["connection"])
+        self.assertEqual({"score": 3.0}, response["response"])
+
+        status, _, response = await self.read_response(reader)
+        self.assertEqual(api.OK, status)
+        self.assertEqual(["1", "2"], sorted(response["response"]))
+        writer.close()
+
+    async def test_errors(self):
+        reader, writer = await asyncio.open_connection("localhost", self.port)
+        writer.write(self.encode(self.get_request("online_score", {}), path="/unknown/"))
+        writer.write(self.encode(self.get_request("online_score", {"phone": "79175002040"})))
+        writer.write(b"POST /method/ HTTP/1.1\r\nContent-Length: 3\r\nConnection: close\r\n\r\n{{{")
+        await writer.drain()
+
+        status, _, _ = await self.read_response(reader)
+        self.assertEqual(api.NOT_FOUND, status)
+        status, _, _ = await self.read_response(reader)
+        self.assertEqual(api.INVALID_REQUEST, status)
+        status, headers, response = await self.read_response(reader)
+        self.assertEqual(api.BAD_REQUEST, status)
+        self.assertEqual("close", headers["connection"])
+        self.assertEqual(b"", await reader.read())
+        writer.close()
+
+    async def test_metrics(self):
+        reader, writer = await asyncio.open_connection("localhost", self.port)
+        writer.write(self.encode(self.get_request("clients_interests", {"client_ids": [1]})))
+        writer.write(b"GET /metrics HTTP/1.1\r\n\r\nGET /unknown HTTP/1.1\r\n\r\n")
+        await writer.drain()
+
+        status, _, _ = await self.read_response(reader)
+        self.assertEqual(api.OK, status)
+        head = await reader.readuntil(b"\r\n\r\n")
+        self.assertIn(b"Content-Type: text/plain", head)
+        length = int(head.split(b"Content-Length: ")[1].split(b"\r\n")[0])
+        body = (await reader.readexactly(length)).decode("utf-8")
+        self.assertIn('scoring_method_requests_total{method="clients_interests"}', body)
+        status, _, _ = await self.read_response(reader)
+        self.assertEqual(api.NOT_FOUND, status)
+        writer.close()
+
+    async def test_body_limits(self):
+        reader, writer = await asyncio.open_connection("localhost", self.port)
+        writer.write(b"POST /method/ HTTP/1.1\r\nContent-Length: 1025\r\n\r\n")
+        await writer.drain()
+        status, headers, _ = await self.read_response(reader)
+        self.assertEqual(api.REQUEST_ENTITY_TOO_LARGE, status)
+        self.assertEqual("close", headers["connection"])
+        writer.close()
+
+        reader, writer = await asyncio.open_connection("localhost", self.port)
+        writer.write(b"POST /method/ HTTP/1.1\r\nContent-Length: 10\r\n\r\n{")
+        await writer.drain()
+        status, headers, _ = await self.read_response(reader)
+        self.assertEqual(api.REQUEST_TIMEOUT, status)
+        writer.close()
+
+    async def test_headers_timeout(self):
+        reader, writer = await asyncio.open_connection("localhost", self.port)
+        writer.write(b"POST /method/ HTTP/1.1\r\nContent-")
+        await writer.drain()
+        self.assertEqual(b"", await asyncio.wait_for(reader.read(), 2))
+        writer.close()
+
+    async def test_streamed_interests(self):
+        api.ClientInterestsHandler.stream_threshold = 2
+        self.addCleanup(setattr, api.ClientInterestsHandler, "stream_threshold", None)
+        reader, writer = await asyncio.open_connection("localhost", self.port)
+        request = self.get_request("clients_interests", {"client_ids": [1, 2, 3]})
+        writer.write(self.encode(request) + self.encode(request))
+        await writer.drain()
+
+        for _ in range(2):
+            head = await reader.readuntil(b"\r\n\r\n")
+            self.assertIn(b"Transfer-Encoding: chunked", head)
+            body = b""
+            while True:
+                size = int(await reader.readline(), 16)
+                chunk = await reader.readexactly(size + 2)
+                if not size:
+                    break
+                body += chunk[:-2]
+            response = json.loads(body)
+            self.assertEqual(["1", "2", "3"], list(response["response"]))
+        writer.close()
+
+
+class TestAsyncStore(AsyncServerMixin, unittest.IsolatedAsyncioTestCase):
+    def make_store(self):
+        self.storage = InMemoryStorage()
+        self.storage.set(scoring.get_interests_key(1), json.dumps(["cars", "pets"]))
+        self.storage.set(scoring.get_interests_key(2), json.dumps(["books"]))
+        return AsyncTarantoolConnection(self.storage, max_workers=2)
+
+    async def test_score_cached(self):
+        arguments = {"phone": "79175002040", "email": "stupnikov@otus.ru"}
+        key = scoring.get_score_key(arguments["phone"], arguments["email"])
+        reader, writer = await asyncio.open_connection("localhost", self.port)
+        for _ in range(2):
+            writer.write(self.encode(self.get_request("online_score", arguments)))
+            await writer.drain()
+            status, _, response = await self.read_response(reader)
+            self.assertEqual(api.OK, status)
+            self.assertEqual({"score": 3.0}, response["response"])
+            self.assertEqual(3.0, self.storage.cache_get(key))
+        writer.close()
+
+    async def test_interests(self):
+        reader, writer = await asyncio.open_connection("localhost", self.port)
+        writer.write(self.encode(self.get_request("clients_interests", {"client_ids": [1, 2, 1]})))
+        await writer.drain()
+        status, _, response = await self.read_response(reader)
+        self.assertEqual(api.OK, status)
+        self.assertEqual({"1": ["cars", "pets"], "2": ["books"]}, response["response"])
+        writer.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
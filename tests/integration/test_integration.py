@@ -223,6 +223,61 @@ class TestSuite(unittest.TestCase):
         self.assertTrue(all(v and isinstance(v, list) and all(isinstance(i, str) for i in v)for v in response.values()))
         self.assertEqual(self.context.get("nclients"), len(arguments["client_ids"]))
 
+    @cases(
+        [
+            {},
+            {"items": []},
+            {"items": {"phone": "79175002040"}},
+            {"items": [{"phone": "79175002040", "email": "stupnikov@otus.ru"}, 1]},
+        ]
+    )
+    def test_invalid_score_batch_request(self, arguments):
+        request = {
+            "account": "horns&hoofs",
+            "login": "h&f",
+            "method": "online_score_batch",
+            "arguments": arguments,
+        }
+        self.set_valid_auth(request)
+        response, code = self.get_response(request)
+        self.assertEqual(api.INVALID_REQUEST, code, arguments)
+        self.assertTrue(len(response))
+
+    def test_ok_score_batch_request(self):
+        items = [
+            {"phone": "79175002040", "email": "stupnikov@otus.ru"},
+            {"phone": "89175002040", "email": "stupnikov@otus.ru"},
+            {"first_name": "a", "last_name": "b"},
+            {"phone": "79175002040"},
+        ]
+        request = {
+            "account": "horns&hoofs",
+            "login": "h&f",
+            "method": "online_score_batch",
+            "arguments": {"items": items},
+        }
+        self.set_valid_auth(request)
+        response, code = self.get_response(request)
+        self.assertEqual(api.OK, code)
+        self.assertEqual(len(items), len(response))
+        self.assertEqual([api.OK, api.INVALID_REQUEST, api.OK, api.INVALID_REQUEST], [r["code"] for r in response])
+        self.assertEqual({"score": 3.0}, response[0]["response"])
+        self.assertEqual({"score": 0.5}, response[2]["response"])
+        self.assertTrue(response[1]["error"])
+        self.assertEqual(self.context["nitems"], len(items))
+
+    def test_ok_score_batch_admin_request(self):
+        request = {
+            "account": "horns&hoofs",
+            "login": "admin",
+            "method": "online_score_batch",
+            "arguments": {"items": [{"first_name": "a", "last_name": "b"}] * 2},
+        }
+        self.set_valid_auth(request)
+        response, code = self.get_response(request)
+        self.assertEqual(api.OK, code)
+        self.assertEqual([{"code": api.OK, "response": {"score": 42}}] * 2, response)
+
 
 if __name__ == "__main__":
     unittest.main()
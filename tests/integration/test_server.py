@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import http.client
+import json
+import os
+import pstats
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import unittest
+
+import api
+
+
+class LimitedHTTPHandler(api.MainHTTPHandler):
+    timeout = 1
+    max_requests = 2
+    max_body_size = 1024
+    body_timeout = 0.5
+
+
+class ServerMixin:
+    """
+    Thread pool server of the handler, started for every test
+    """
+
+    handler = api.MainHTTPHandler
+    threads = 4
+
+    def setUp(self):
+        self.stores = []
+        self.server = api.ThreadPoolHTTPServer(
+            ("localhost", 0), self.handler, threads=self.threads, store_factory=self.make_store
+        )
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def make_store(self):
+        store = {}
+        self.stores.append(store)
+        return store
+
+    def post(self, path, body, headers=None):
+        conn = http.client.HTTPConnection(*self.server.server_address, timeout=5)
+        try:
+            conn.request("POST", path, json.dumps(body), headers or {})
+            response = conn.getresponse()
+            return response.status, json.loads(response.read())
+        finally:
+            conn.close()
+
+    def get_request(self):
+        request = {"account": "horns&hoofs", "login": "h&f", "method": "online_score"}
+        msg = request["account"] + request["login"] + api.SALT
+        request["token"] = hashlib.sha512(msg.encode("utf-8")).hexdigest()
+        request["arguments"] = {"phone": "79175002040", "email": "stupnikov@otus.ru"}
+        return request
+
+
+class TestThreadPoolServer(ServerMixin, unittest.TestCase):
+    def test_ok_request(self):
+        status, response = self.post("/method/", self.get_request())
+        self.assertEqual(api.OK, status)
+        self.assertEqual({"code": api.OK, "response": {"score": 3.0}}, response)
+
+    def test_not_found(self):
+        status, response = self.post("/unknown/", self.get_request())
+        self.assertEqual(api.NOT_FOUND, status)
+        self.assertEqual(api.ERRORS[api.NOT_FOUND], response["error"])
+
+    def test_metrics(self):
+        self.post("/method/", self.get_request())
+        conn = http.client.HTTPConnection(*self.server.server_address, timeout=5)
+        conn.request("GET", "/metrics")
+        response = conn.getresponse()
+        body = response.read().decode("utf-8")
+        conn.close()
+        self.assertEqual(api.OK, response.status)
+        self.assertTrue(response.getheader("Content-Type").startswith("text/plain"))
+        self.assertIn("# TYPE scoring_method_duration_seconds histogram", body)
+        self.assertIn('scoring_method_requests_total{method="online_score"}', body)
+        self.assertIn('scoring_http_requests_total{code="200"}', body)
+
+    def test_concurrent_requests(self):
+        results = []
+
+        def worker():
+            results.append(self.post("/method/", self.get_request())[0])
+
+        threads = [threading.Thread(target=worker) for _ in range(16)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual([api.OK] * 16, results)
+        self.assertEqual(1, len(self.stores))
+
+    def test_keep_alive(self):
+        conn = http.client.HTTPConnection(*self.server.server_address, timeout=5)
+        for _ in range(3):
+            conn.request("POST", "/method/", json.dumps(self.get_request()))
+            response = conn.getresponse()
+            self.assertEqual(api.OK, response.status)
+            self.assertEqual(response.getheader("Content-Length"), str(len(response.read())))
+            self.assertFalse(response.will_close)
+        conn.close()
+
+    def test_bad_content_length_closes_connection(self):
+        conn = http.client.HTTPConnection(*self.server.server_address, timeout=5)
+        conn.putrequest("POST", "/method/")
+        conn.putheader("Content-Length", "abc")
+        conn.endheaders()
+        response = conn.getresponse()
+        self.assertEqual(api.BAD_REQUEST, response.status)
+        response.read()
+        self.assertTrue(response.will_close)
+        conn.close()
+
+    def test_streamed_interests(self):
+        request = self.get_request()
+        request["method"] = "clients_interests"
+        request["arguments"] = {"client_ids": list(range(25)) + [1, 2]}
+        api.ClientInterestsHandler.stream_threshold = 10
+        self.addCleanup(setattr, api.ClientInterestsHandler, "stream_threshold", None)
+        self.addCleanup(setattr, api.ClientInterestsHandler, "page_size", api.STREAM_PAGE_SIZE)
+        api.ClientInterestsHandler.page_size = 10
+
+        conn = http.client.HTTPConnection(*self.server.server_address, timeout=5)
+        for _ in range(2):
+            conn.request("POST", "/method/", json.dumps(request))
+            response = conn.getresponse()
+            self.assertEqual("chunked", response.getheader("Transfer-Encoding"))
+            body = json.loads(response.read())
+            self.assertEqual(api.OK, body["code"])
+            self.assertEqual([str(i) for i in range(25)], list(body["response"]))
+        conn.close()
+
+
+class TestKeepAliveLimits(ServerMixin, unittest.TestCase):
+    handler = LimitedHTTPHandler
+
+    def test_keep_alive(self):
+        conn = http.client.HTTPConnection(*self.server.server_address, timeout=5)
+        closes = []
+        for _ in range(2):
+            conn.request("POST", "/method/", json.dumps(self.get_request()))
+            response = conn.getresponse()
+            response.read()
+            closes.append(response.will_close)
+        self.assertEqual([False, True], closes)
+        conn.close()
+
+    def test_body_too_large(self):
+        conn = http.client.HTTPConnection(*self.server.server_address, timeout=5)
+        conn.putrequest("POST", "/method/")
+        conn.putheader("Content-Length", "1025")
+        conn.endheaders()
+        response = conn.getresponse()
+        self.assertEqual(api.REQUEST_ENTITY_TOO_LARGE, response.status)
+        self.assertEqual(api.ERRORS[api.REQUEST_ENTITY_TOO_LARGE], json.loads(response.read())["error"])
+        self.assertTrue(response.will_close)
+        conn.close()
+
+    def test_body_timeout(self):
+        sock = socket.create_connection(self.server.server_address, timeout=5)
+        sock.sendall(b"POST /method/ HTTP/1.1\r\nContent-Length: 100\r\n\r\n{")
+        for _ in range(3):
+            time.sleep(0.2)
+            sock.sendall(b" ")
+        response = sock.makefile("rb").read()
+        self.assertTrue(response.startswith(b"HTTP/1.1 408"))
+        sock.close()
+
+    def test_idle_timeout(self):
+        sock = socket.create_connection(self.server.server_address, timeout=5)
+        self.assertEqual(b"", sock.recv(1))
+        sock.close()
+
+
+class SlowIdleHTTPHandler(api.MainHTTPHandler):
+    timeout = 5
+
+
+class TestBusyServer(ServerMixin, unittest.TestCase):
+    handler = SlowIdleHTTPHandler
+    threads = 2
+
+    def test_idle_connections_closed_for_waiting_client(self):
+        idle = []
+        for _ in range(self.threads):
+            conn = http.client.HTTPConnection(*self.server.server_address, timeout=5)
+            conn.request("POST", "/method/", json.dumps(self.get_request()))
+            response = conn.getresponse()
+            response.read()
+            self.assertFalse(response.will_close)
+            idle.append(conn)
+
+        started = time.monotonic()
+        status, _ = self.post("/method/", self.get_request())
+        self.assertEqual(api.OK, status)
+        self.assertLess(time.monotonic() - started, 1)
+        for conn in idle:
+            self.assertEqual(b"", conn.sock.recv(1))
+            conn.close()
+
+    def test_idle_connection_kept_while_not_busy(self):
+        conn = http.client.HTTPConnection(*self.server.server_address, timeout=5)
+        for _ in range(2):
+            conn.request("POST", "/method/", json.dumps(self.get_request()))
+            response = conn.getresponse()
+            response.read()
+            self.assertEqual(api.OK, response.status)
+            time.sleep(0.2)
+        conn.close()
+
+
+class TestProfiling(ServerMixin, unittest.TestCase):
+    def setUp(self):
+        self.profile_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.profile_dir)
+        self.handler = type("ProfiledHTTPHandler", (api.MainHTTPHandler,), {"profile_dir": self.profile_dir})
+        super().setUp()
+
+    def test_profiled_request(self):
+        status, _ = self.post("/method/", self.get_request(), {"X-Profile": "1", "HTTP_X_REQUEST_ID": "req-1"})
+        self.assertEqual(api.OK, status)
+        self.assertEqual(["req-1.prof"], os.listdir(self.profile_dir))
+        self.assertFalse(self.handler.profile_lock.locked())
+        stats = pstats.Stats(os.path.join(self.profile_dir, "req-1.prof"))
+        self.assertIn("method_handler", [name for _, _, name in stats.stats])
+
+    def test_unsafe_request_id(self):
+        self.post("/method/", self.get_request(), {"X-Profile": "1", "HTTP_X_REQUEST_ID": "../req"})
+        (name,) = os.listdir(self.profile_dir)
+        self.assertRegex(name, r"^[0-9a-f]{32}\.prof$")
+
+    def test_busy_profiler(self):
+        with self.handler.profile_lock:
+            status, response = self.post("/method/", self.get_request(), {"X-Profile": "1"})
+        self.assertEqual(api.OK, status)
+        self.assertEqual({"score": 3.0}, response["response"])
+        self.assertEqual([], os.listdir(self.profile_dir))
+
+    def test_not_profiled_without_header(self):
+        self.post("/method/", self.get_request())
+        self.assertEqual([], os.listdir(self.profile_dir))
+
+    def test_not_profiled_when_disabled(self):
+        for value in ["0", "false"]:
+            status, _ = self.post("/method/", self.get_request(), {"X-Profile": value})
+            self.assertEqual(api.OK, status)
+        self.assertEqual([], os.listdir(self.profile_dir))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import json
+import logging
+import os
+import queue
+import tempfile
+import unittest
+
+import access_log
+
+
+def make_record(code=200, request=b'{"login": "h&f"}', response=b'{"code": 200}'):
+    record = logging.LogRecord("access", logging.INFO, __file__, 1, "%s %s %s", ("/method/", code, "id"), None)
+    fields = {
+        "request_id": "id",
+        "path": "/method/",
+        "code": code,
+        "duration": 1.5,
+        "context": {"has": ["phone"]},
+        "request": request,
+        "response": response,
+    }
+    record.__dict__.update(fields)
+    return record
+
+
+class TestFormatters(unittest.TestCase):
+    def test_json(self):
+        line = access_log.JsonFormatter(max_body=5).format(make_record())
+        data = json.loads(line)
+        self.assertEqual("/method/ 200 id", data["message"])
+        self.assertEqual({"has": ["phone"]}, data["context"])
+        self.assertEqual('{"log...', data["request"])
+        self.assertEqual(200, data["code"])
+
+    def test_text(self):
+        line = access_log.TextFormatter().format(make_record(response=None))
+        self.assertTrue(line.endswith(
+            "I /method/ 200 id duration=1.5 context={'has': ['phone']} request={\"login\": \"h&f\"}"
+        ))
+
+    def test_plain_record(self):
+        record = logging.LogRecord("root", logging.INFO, __file__, 1, "Started %s", ("server",), None)
+        self.assertEqual("Started server", json.loads(access_log.JsonFormatter().format(record))["message"])
+
+
+class TestSamplingFilter(unittest.TestCase):
+    def test_sampling(self):
+        self.assertFalse(access_log.SamplingFilter(0).filter(make_record()))
+        self.assertTrue(access_log.SamplingFilter(0).filter(make_record(code=500)))
+        self.assertTrue(access_log.SamplingFilter(1).filter(make_record()))
+
+
+class TestQueueHandler(unittest.TestCase):
+    def test_records_not_formatted(self):
+        handler = access_log.DroppingQueueHandler(queue.Queue(1))
+        record = make_record()
+        handler.handle(record)
+        self.assertIs(record, handler.queue.get_nowait())
+        self.assertEqual(("/method/", 200, "id"), record.args)
+
+    def test_full_queue_drops(self):
+        handler = access_log.DroppingQueueHandler(queue.Queue(1))
+        handler.handle(make_record())
+        handler.handle(make_record())
+        self.assertEqual(1, handler.dropped)
+
+
+class TestSetupLogging(unittest.TestCase):
+    def setUp(self):
+        root = logging.getLogger()
+        self.addCleanup(setattr, root, "handlers", root.handlers)
+        self.addCleanup(root.setLevel, root.level)
+        fd, self.filename = tempfile.mkstemp()
+        os.close(fd)
+        self.addCleanup(os.remove, self.filename)
+
+    def test_json_lines(self):
+        listener = access_log.setup_logging(self.filename, max_body=8)
+        access_log.log_access("id", "/method/", 200, 0.001, {"has": []}, b'{"login": "h&f"}', b"{}")
+        logging.info("Stopped server")
+        listener.stop()
+        with open(self.filename) as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual(["/method/ 200 id", "Stopped server"], [line["message"] for line in lines])
+        self.assertEqual('{"login"...', lines[0]["request"])
+        self.assertEqual(1.0, lines[0]["duration"])
+
+
+if __name__ == "__main__":
+    unittest.main()
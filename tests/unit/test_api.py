@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import datetime
+import hashlib
+import json
+import unittest
+
+import api
+import json_codec
+from tests.utils import cases
+
+
+class Request:
+    def __init__(self, account, login, token):
+        self.account = account
+        self.login = login
+        self.token = token
+
+    @property
+    def is_admin(self):
+        return self.login == api.ADMIN_LOGIN
+
+
+class TestCheckAuth(unittest.TestCase):
+    def get_token(self, account, login):
+        return hashlib.sha512((account + login + api.SALT).encode("utf-8")).hexdigest()
+
+    def get_admin_token(self):
+        byte = datetime.datetime.now().strftime("%Y%m%d%H") + api.ADMIN_SALT
+        return hashlib.sha512(byte.encode("utf-8")).hexdigest()
+
+    def test_user(self):
+        token = self.get_token("horns&hoofs", "h&f")
+        self.assertTrue(api.check_auth(Request("horns&hoofs", "h&f", token)))
+        self.assertTrue(api.check_auth(Request("horns&hoofs", "h&f", token)))
+        self.assertFalse(api.check_auth(Request("horns&hoofs", "h&g", token)))
+
+    def test_admin(self):
+        self.assertTrue(api.check_auth(Request("horns&hoofs", "admin", self.get_admin_token())))
+        self.assertFalse(api.check_auth(Request("horns&hoofs", "admin", self.get_token("horns&hoofs", "admin"))))
+
+    def test_admin_token_rotated(self):
+        admin_token = api.AdminToken()
+        admin_token.token, admin_token.expires = b"old", 0.0
+        self.assertEqual(self.get_admin_token().encode("ascii"), admin_token())
+        self.assertGreater(admin_token.expires, datetime.datetime.now().timestamp())
+
+    @cases([None, "", "токен", 1])
+    def test_invalid_token(self, token):
+        self.assertFalse(api.check_auth(Request("horns&hoofs", "h&f", token)))
+
+
+class TestStreamEncoder(unittest.TestCase):
+    def encode(self, chunked):
+        encoder = api.StreamEncoder(json_codec.get_codec("json"), chunked)
+        return encoder.begin() + b"".join(encoder.encode(page) for page in [{1: "a"}, {}, {2: "b"}]) + encoder.end()
+
+    def test_plain(self):
+        self.assertEqual({"code": 200, "response": {"1": "a", "2": "b"}}, json.loads(self.encode(False)))
+
+    def test_chunked(self):
+        body, chunks = self.encode(True), []
+        while True:
+            size, _, body = body.partition(b"\r\n")
+            chunks.append(body[: int(size, 16)])
+            body = body[int(size, 16) + 2 :]
+            if size == b"0":
+                break
+        self.assertEqual(b"", body)
+        self.assertEqual(b"", chunks[-1])
+        self.assertEqual({"code": 200, "response": {"1": "a", "2": "b"}}, json.loads(b"".join(chunks)))
+
+
+if __name__ == "__main__":
+    unittest.main()
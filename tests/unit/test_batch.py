@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import api
+import batch
+from jsonl_reader import JsonlFile
+from benchmarks.load import sign
+
+
+def get_request(method, arguments):
+    return sign({"account": "a", "login": "b", "method": method, "arguments": arguments})
+
+
+def get_lines():
+    score = get_request("online_score", {"first_name": "a", "last_name": "b"})
+    interests = get_request("clients_interests", {"client_ids": [1]})
+    invalid = get_request("online_score", {"phone": "79175002040"})
+    lines = [json.dumps(score), json.dumps(interests), "{", json.dumps(invalid), "[]", ""]
+    return [(line + "\n").encode("utf-8") for line in lines] * 7
+
+
+class TestBatch(unittest.TestCase):
+    def score(self, workers, chunk_size=4):
+        output = io.BytesIO()
+        count = batch.run(iter(get_lines()), output, workers=workers, chunk_size=chunk_size, store="memory")
+        self.assertEqual(len(get_lines()), count)
+        return [json.loads(line) for line in output.getvalue().splitlines()]
+
+    def test_in_process(self):
+        responses = self.score(workers=1)
+        self.assertEqual(len(get_lines()), len(responses))
+        codes = [r["code"] for r in responses[:6]]
+        expected = [api.OK, api.OK, api.BAD_REQUEST, api.INVALID_REQUEST, api.BAD_REQUEST, api.BAD_REQUEST]
+        self.assertEqual(expected, codes)
+        self.assertEqual({"score": 0.5}, responses[0]["response"])
+        self.assertEqual(["1"], list(responses[1]["response"]))
+
+    def test_process_pool_keeps_order(self):
+        self.assertEqual(
+            [r["code"] for r in self.score(workers=1)],
+            [r["code"] for r in self.score(workers=2, chunk_size=3)],
+        )
+
+    def test_file(self):
+        with tempfile.TemporaryDirectory() as path:
+            path = os.path.join(path, "requests.jsonl")
+            with open(path, "wb") as f:
+                f.writelines(get_lines())
+            for workers in (1, 2):
+                output = io.BytesIO()
+                count = batch.run_file(path, output, workers=workers, chunk_size=4, store="memory")
+                self.assertEqual(len(get_lines()), count)
+                responses = [json.loads(line) for line in output.getvalue().splitlines()]
+                self.assertEqual([r["code"] for r in self.score(workers=1)], [r["code"] for r in responses])
+
+    def test_file_index_not_saved(self):
+        with tempfile.TemporaryDirectory() as path:
+            path = os.path.join(path, "requests.jsonl")
+            with open(path, "wb") as f:
+                f.writelines(get_lines())
+            build_index = mock.Mock(side_effect=JsonlFile.build_index, autospec=True)
+            with mock.patch.object(JsonlFile, "save_index", return_value=False), mock.patch.object(
+                JsonlFile, "build_index", lambda reader: build_index(reader)
+            ):
+                output = io.BytesIO()
+                count = batch.run_file(path, output, workers=1, chunk_size=4, store="memory")
+                self.assertEqual(len(get_lines()), count)
+            # the worker reads the offsets built by the opener
+            self.assertEqual(1, build_index.call_count)
+            self.assertIsNone(batch.worker_reader)
+
+    def test_chunks(self):
+        self.assertEqual([[1, 2], [3, 4], [5]], list(batch.read_chunks(iter([1, 2, 3, 4, 5]), 2)))
+
+
+if __name__ == "__main__":
+    unittest.main()
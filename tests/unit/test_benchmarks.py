@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import unittest
+from unittest import mock
+
+import api
+from benchmarks import load, micro
+from storage import InMemoryStorage
+from tests.utils import cases
+
+
+class TestLoad(unittest.TestCase):
+    @cases([(50, 5), (95, 10), (99, 10), (10, 1), (0, 1)])
+    def test_percentile(self, p, expected):
+        self.assertEqual(expected, load.percentile(list(range(1, 11)), p))
+
+    def test_seeds_signed(self):
+        seeds = load.load_seeds()
+        admin = [seed for seed in seeds if seed["login"] == api.ADMIN_LOGIN]
+        self.assertTrue(admin)
+        self.assertTrue(all("token" not in seed for seed in admin))
+        self.assertTrue(all(seed["token"] for seed in seeds if seed["login"] != api.ADMIN_LOGIN))
+        for seed in seeds:
+            self.assertTrue(api.check_auth(api.MethodRequest(load.sign(seed))))
+
+    def test_admin_signed_on_sending(self):
+        seeds = [{"account": "a", "login": api.ADMIN_LOGIN, "method": "online_score", "arguments": {}}]
+        client = mock.Mock(return_value=api.OK)
+        with mock.patch.object(api, "admin_token", side_effect=[b"1", b"2"]):
+            load.run(lambda: client, seeds, 2, 1)
+        self.assertEqual(["1", "2"], [request["token"] for (request,), _ in client.call_args_list])
+
+    def test_in_process_run(self):
+        store = InMemoryStorage()
+        summary = load.run(lambda: load.InProcessClient(store), load.load_seeds(), 50, 4)
+        self.assertEqual(50, summary["requests"])
+        self.assertEqual(50, sum(summary["codes"].values()))
+        self.assertNotIn(None, summary["codes"])
+        self.assertLessEqual(summary["p50"], summary["p99"])
+        self.assertIn("throughput", load.format_summary(summary))
+
+
+class TestMicro(unittest.TestCase):
+    def test_benchmarks_run(self):
+        results = micro.run(micro.make_benchmarks(), repeat=1, number=10)
+        self.assertIn("PhoneField", results)
+        self.assertIn("get_score", results)
+        self.assertTrue(all(result["time"] > 0 for result in results.values()))
+        self.assertGreater(results["method_handler"]["memory"], 0)
+
+    def test_allocations(self):
+        self.assertEqual(0, micro.measure_allocations(lambda: None))
+        # three lists at least, with their items
+        self.assertGreaterEqual(micro.measure_allocations(lambda: [[1], [2]]), 3)
+
+    def test_compare(self):
+        baseline = {
+            "a": {"time": 1.0, "allocations": 10, "memory": 100},
+            "b": {"time": 1.0, "allocations": 10, "memory": 100},
+            "d": {"time": 1.0, "allocations": 0, "memory": 0},
+        }
+        results = {
+            "a": {"time": 1.1, "allocations": 13, "memory": 500},
+            "b": {"time": 1.3, "allocations": 10, "memory": 100},
+            "c": {"time": 5.0, "allocations": 50, "memory": 500},
+            "d": {"time": 1.0, "allocations": 2, "memory": 64},
+        }
+        self.assertEqual(["a allocations", "b time"], micro.compare(results, baseline, threshold=0.2))
+        self.assertEqual([], micro.compare(results, baseline, threshold=0.5))
+        self.assertIn("+30.0%", micro.format_results(results, baseline))
+
+    def test_compare_old_baseline(self):
+        baseline = {"a": {"time": 1.0, "memory": 100}}
+        self.assertEqual([], micro.compare({"a": {"time": 1.0, "allocations": 5, "memory": 200}}, baseline))
+
+
+if __name__ == "__main__":
+    unittest.main()
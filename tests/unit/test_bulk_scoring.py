@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import unittest
+
+import api
+import bulk_scoring
+import scoring
+from tests.utils import cases
+
+ROWS = [
+    {"phone": "79175002040", "email": "stupnikov@otus.ru"},
+    {"phone": 79175002040, "email": "stupnikov@otus.ru", "gender": 1, "birthday": "01.01.2000"},
+    {"gender": 0, "birthday": "01.01.2000", "first_name": "a", "last_name": "b"},
+    {"first_name": "a", "last_name": "b"},
+    {"phone": "79175002040"},
+    {"phone": "89175002040", "email": "stupnikov@otus.ru"},
+    {"email": "stupnikovotus.ru", "gender": 5, "first_name": "a", "last_name": "b"},
+    {"birthday": "01.01.1890", "gender": 1},
+    {"gender": True, "birthday": "01.01.2000"},
+    {},
+]
+
+
+def get_columns(rows):
+    return {name: [row.get(name) for row in rows] for name in bulk_scoring.COLUMNS}
+
+
+def score_row(row):
+    try:
+        method = api.OnlineScoreHandler(row)
+        method.validate()
+    except ValueError as e:
+        return 0.0, str(e)
+    return scoring.calc_score(*(getattr(method, name) for name in bulk_scoring.COLUMNS)), None
+
+
+class TestBulkScoring(unittest.TestCase):
+    def test_same_as_rows(self):
+        scores, errors = bulk_scoring.bulk_score(get_columns(ROWS * 3), use_numpy=False)
+        self.assertEqual([score_row(row) for row in ROWS * 3], list(zip(scores, errors)))
+
+    def test_empty_row(self):
+        _, errors = bulk_scoring.bulk_score(get_columns([{}]), use_numpy=False)
+        self.assertEqual(["Empty OnlineScoreHandler."], errors)
+
+    @unittest.skipUnless(bulk_scoring.numpy, "NumPy is not installed")
+    def test_numpy_same_as_rows(self):
+        scores, errors = bulk_scoring.bulk_score(get_columns(ROWS * 3), use_numpy=True)
+        self.assertEqual([score_row(row) for row in ROWS * 3], list(zip(scores.tolist(), errors)))
+
+    @unittest.skipUnless(bulk_scoring.numpy, "NumPy is not installed")
+    def test_numpy(self):
+        columns = [bulk_scoring.validate_columns(get_columns(ROWS))[0][name] for name in bulk_scoring.COLUMNS]
+        self.assertEqual(
+            bulk_scoring.score_columns(*columns, use_numpy=False),
+            list(bulk_scoring.score_columns(*columns, use_numpy=True)),
+        )
+
+    @cases([(["7"], ["a@b"], [], [], [], []), (["7"], ["a@b", "c@d"], [None], [None], [None], [None])])
+    def test_columns_length(self, *columns):
+        with self.assertRaises(ValueError):
+            bulk_scoring.score_columns(*columns)
+
+    def test_missing_columns(self):
+        cleaned, errors = bulk_scoring.validate_columns({"phone": ["79175002040", "1"], "email": ["a@b", "a@b"]})
+        self.assertEqual([None, None], cleaned["gender"])
+        self.assertEqual(["79175002040", None], cleaned["phone"])
+        self.assertIsNone(errors[0])
+        self.assertIn("phone", errors[1])
+
+    def test_unhashable_values(self):
+        cleaned, errors = bulk_scoring.validate_columns({"first_name": [["a"]], "last_name": ["b"]})
+        self.assertEqual([None], cleaned["first_name"])
+        self.assertIn("first_name", errors[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
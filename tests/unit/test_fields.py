@@ -1,9 +1,12 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import datetime
 import functools
+import time
 import unittest
 
 import api
+import class_fields
 from tests.utils import cases
 
 
@@ -23,6 +26,36 @@ class TestSuite(unittest.TestCase):
         self.assertEqual(api.INVALID_REQUEST, code)
 
 
+class TestRequestData(unittest.TestCase):
+    def test_fields_gathered(self):
+        self.assertEqual(["client_ids", "date"], [k for k, _ in api.ClientInterestsHandler._fields])
+        self.assertEqual(
+            ["account", "login", "token", "arguments", "method"], [k for k, _ in api.MethodRequest._fields]
+        )
+
+    def test_values(self):
+        request = api.ClientInterestsHandler({"client_ids": [1, 2], "date": "20.07.2017"})
+        self.assertEqual([1, 2], request.client_ids)
+        self.assertEqual("2017-07-20", str(request.date))
+
+    def test_slots(self):
+        request = api.ClientInterestsHandler({"client_ids": [1, 2]})
+        self.assertFalse(hasattr(request, "__dict__"))
+        self.assertEqual(("_client_ids", "_date"), api.ClientInterestsHandler.__slots__)
+        self.assertIsNone(request.date)
+        self.assertFalse(hasattr(api.MethodRequest.login, "__dict__"))
+        self.assertIsInstance(api.MethodRequest.login, api.CharField)
+
+    def test_errors_joined(self):
+        with self.assertRaises(ValueError) as e:
+            api.MethodRequest({"account": 1, "login": "h&f"})
+        self.assertEqual(
+            'Field account: Field "_account" must be a string, Field token: required not set, '
+            "Field arguments: required not set, Field method: required not set",
+            str(e.exception),
+        )
+
+
 class TestCharField(unittest.TestCase):
     @cases(["", "Test", "/test", "\\test"])
     def test_valid_value(self, val):
@@ -53,6 +86,21 @@ class TestArgumentsField(unittest.TestCase):
             api.ArgumentsField(required=False, nullable=True).validate(value=val)
 
 
+class TestArgumentsListField(unittest.TestCase):
+    @cases([[], [{}], [{"key": "val"}, {}]])
+    def test_valid_value(self, val):
+        """Testing VALID ArgumentsListField"""
+        self.assertIsNotNone(
+            api.ArgumentsListField(required=False, nullable=True).validate(value=val)
+        )
+
+    @cases([{}, "", [1], [{}, "key"]])
+    def test_invalid_value(self, val):
+        """Testing INVALID ArgumentsListField"""
+        with self.assertRaises(ValueError):
+            api.ArgumentsListField(required=False, nullable=True).validate(value=val)
+
+
 class TestEmailField(unittest.TestCase):
     @cases(["a@b.ru", "e@mail.ru"])
     def test_valid_value(self, val):
@@ -98,6 +146,35 @@ class TestDateField(unittest.TestCase):
             api.DateField(required=False, nullable=True).validate(value=val)
 
 
+class TestParseDate(unittest.TestCase):
+    @cases(["01.05.1987", "29.02.2000", "1.5.1987", "31.12.9999"])
+    def test_same_as_strptime(self, val):
+        """Testing parse_date is equal to strptime"""
+        self.assertEqual(
+            datetime.datetime.strptime(val, "%d.%m.%Y").date(), class_fields.parse_date(val)
+        )
+
+    @cases(["29.02.1900", "00.01.2000", "01.13.2000", "01.05.0000", "+1.05.2000", "\u0661\u0661.01.2000"])
+    def test_invalid_value(self, val):
+        """Testing INVALID dates"""
+        with self.assertRaises(ValueError):
+            class_fields.parse_date(val)
+
+
+class TestToday(unittest.TestCase):
+    def test_today(self):
+        today = class_fields.Today()
+        self.assertEqual(datetime.date.today(), today())
+        self.assertGreater(today.expires, time.time())
+
+    def test_cached_until_midnight(self):
+        today = class_fields.Today()
+        today.date, today.expires = datetime.date(2000, 1, 1), time.time() + 60
+        self.assertEqual(datetime.date(2000, 1, 1), today())
+        today.expires = time.time()
+        self.assertEqual(datetime.date.today(), today())
+
+
 class TestBirthDayField(unittest.TestCase):
     @cases(["01.05.1987"])
     def test_valid_value(self, val):
@@ -127,21 +204,40 @@ class TestGenderField(unittest.TestCase):
         with self.assertRaises(ValueError):
             api.GenderField(required=False, nullable=True).validate(val=val)
 
+    def test_error_message(self):
+        field = dict(api.OnlineScoreHandler._fields)["gender"]
+        with self.assertRaisesRegex(ValueError, '^Field "_gender" must be an integer, one of 0, 1, 2$'):
+            field.validate(val=3)
+
 
 class ClientIDsField(unittest.TestCase):
-    @cases([[0, 1], [1]])
+    @cases([[0, 1], [1], [True, 2**70]])
     def test_valid_value(self, val):
         """Testing VALID ClientIDsField"""
         self.assertTrue(
             api.ClientIDsField(required=False, nullable=True).validate(val=val)
         )
 
-    @cases([[], {"key": 1}, "text", [1, "a"], [1.1, 2.2], [[1, 2], [3, 4]]])
+    @cases([[], {"key": 1}, "text", [1, "a"], [1.1, 2.2], [[1, 2], [3, 4]], [1, -(2**70)], [1, None], [2, 1.0]])
     def test_invalid_value(self, val):
         """Testing INVALID ClientIDsField"""
         with self.assertRaises(ValueError):
             api.ClientIDsField(required=False, nullable=True).validate(val=val)
 
+    def test_int_subclass(self):
+        class ClientID(int):
+            pass
+
+        field = api.ClientIDsField(required=False, nullable=True)
+        self.assertTrue(field.validate(val=[ClientID(1), 2]))
+        with self.assertRaises(ValueError):
+            field.validate(val=[ClientID(-1), 2])
+
+    def test_error_message(self):
+        field = dict(api.ClientInterestsHandler._fields)["client_ids"]
+        with self.assertRaisesRegex(ValueError, '^Field "_client_ids" must be a list of positive integers$'):
+            field.validate(val=[1, -1])
+
 
 if __name__ == "__main__":
     unittest.main()
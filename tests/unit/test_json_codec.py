@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import json
+import unittest
+
+import api
+import json_codec
+from tests.utils import cases
+
+AVAILABLE = [name for name, codec in json_codec.CODECS.items() if codec is not None]
+
+
+class TestCodecs(unittest.TestCase):
+    @cases(AVAILABLE)
+    def test_dumps(self, name):
+        codec = json_codec.get_codec(name)
+        data = codec.dumps({"code": 200, "response": {1: ["cars", "книги"]}})
+        self.assertIsInstance(data, bytes)
+        self.assertEqual({"code": 200, "response": {"1": ["cars", "книги"]}}, json.loads(data))
+
+    @cases(AVAILABLE)
+    def test_loads(self, name):
+        codec = json_codec.get_codec(name)
+        self.assertEqual({"login": "книги"}, codec.loads('{"login": "книги"}'.encode("utf-8")))
+        with self.assertRaises(ValueError):
+            codec.loads(b"{{{")
+
+    @cases(AVAILABLE)
+    def test_long_client_id(self, name):
+        codec = json_codec.get_codec(name)
+        arguments = codec.loads(b'{"client_ids": [1180591620717411303424, 1], "date": "20.07.2017"}')
+        self.assertEqual([2**70, 1], arguments["client_ids"])
+        api.ClientInterestsHandler(arguments).validate()
+        data = codec.dumps({"code": 200, "response": {2**70: ["cars"]}})
+        self.assertEqual({"code": 200, "response": {str(2**70): ["cars"]}}, json.loads(data))
+
+    @cases(AVAILABLE)
+    def test_same_as_stdlib(self, name):
+        codec = json_codec.get_codec(name)
+        self.assertEqual(json.loads(b'{"a": NaN}').keys(), codec.loads(b'{"a": NaN}').keys())
+        data = memoryview(b"[18446744073709551617, -1180591620717411303424]")
+        self.assertEqual([2**64 + 1, -(2**70)], codec.loads(data))
+
+    def test_default(self):
+        self.assertEqual(AVAILABLE[0], json_codec.get_codec().name)
+
+    def test_unavailable(self):
+        with self.assertRaises(ValueError):
+            json_codec.get_codec("simplejson")
+
+
+if __name__ == "__main__":
+    unittest.main()
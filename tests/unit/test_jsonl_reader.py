@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+
+from jsonl_reader import JsonlFile
+from tests.utils import cases
+
+
+class TestJsonlFile(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.path = os.path.join(self.dir, "requests.jsonl")
+
+    def open(self, data: bytes) -> JsonlFile:
+        with open(self.path, "wb") as f:
+            f.write(data)
+        reader = JsonlFile(self.path)
+        self.addCleanup(reader.close)
+        return reader
+
+    @cases(
+        [
+            (b"", []),
+            (b"\n", [b""]),
+            (b'{"a": 1}', [b'{"a": 1}']),
+            (b'{"a": 1}\n', [b'{"a": 1}']),
+            (b'{"a": 1}\n\n{"b": 2}', [b'{"a": 1}', b"", b'{"b": 2}']),
+            (b'{"a": 1}\r\n{"b": 2}\n', [b'{"a": 1}\r', b'{"b": 2}']),
+        ]
+    )
+    def test_lines(self, data, expected):
+        reader = self.open(data)
+        self.assertEqual(len(expected), len(reader))
+        self.assertEqual(expected, [line.tobytes() for line in reader])
+        self.assertEqual(expected, [reader[i].tobytes() for i in range(len(reader))])
+
+    def test_random_access(self):
+        reader = self.open(b"".join(b'{"i": %d}\n' % i for i in range(10)))
+        self.assertIsInstance(reader[3], memoryview)
+        self.assertEqual(b'{"i": 9}', reader[-1].tobytes())
+        self.assertEqual([b'{"i": 4}', b'{"i": 5}'], [line.tobytes() for line in reader.lines(4, 6)])
+        self.assertEqual([], list(reader.lines(8, 8)))
+        self.assertRaises(IndexError, reader.__getitem__, 10)
+
+    def test_shards(self):
+        reader = self.open(b"".join(b"%d\n" % i for i in range(10)))
+        shards = [reader.shard(i, 3) for i in range(3)]
+        self.assertEqual([(0, 4), (4, 7), (7, 10)], shards)
+        self.assertRaises(ValueError, reader.shard, 3, 3)
+
+    def test_index_persisted(self):
+        self.open(b"1\n2\n")
+        self.assertTrue(os.path.exists(self.path + ".idx"))
+        reader = JsonlFile(self.path)
+        self.addCleanup(reader.close)
+        reader.build_index = None
+        self.assertEqual(2, len(reader))
+        # offsets are read from the mapping of the index, not copied
+        self.assertIsInstance(reader.offsets, memoryview)
+        self.assertEqual([b"1", b"2"], [line.tobytes() for line in reader])
+        self.assertEqual([b"2"], [line.tobytes() for line in reader.lines(1, 2)])
+
+    def test_partial_index_rebuilt(self):
+        self.open(b"".join(b"%d\n" % i for i in range(10)))
+        index_path = self.path + ".idx"
+        with open(index_path, "r+b") as f:
+            # header and three offsets of ten
+            f.truncate(6 * 8)
+        reader = JsonlFile(self.path)
+        self.addCleanup(reader.close)
+        self.assertEqual(10, len(reader))
+        self.assertTrue(reader.persisted)
+        # no temporary files are left
+        self.assertEqual(["requests.jsonl", "requests.jsonl.idx"], sorted(os.listdir(self.dir)))
+
+    def test_offsets_given(self):
+        reader = self.open(b"1\n2\n")
+        given = JsonlFile(self.path, index_path=os.path.join(self.dir, "missing", "index"), offsets=reader.offsets)
+        self.addCleanup(given.close)
+        self.assertFalse(given.persisted)
+        self.assertEqual([b"1", b"2"], [line.tobytes() for line in given])
+
+    def test_stale_index_rebuilt(self):
+        self.open(b"1\n2\n")
+        reader = self.open(b"1\n2\n3\n")
+        self.assertEqual(3, len(reader))
+
+    def test_close_with_live_slices(self):
+        reader = self.open(b"1\n2\n")
+        line = reader[0]
+        reader.close()
+        self.assertEqual(b"1", line.tobytes())
+
+
+if __name__ == "__main__":
+    unittest.main()
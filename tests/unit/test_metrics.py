@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import hashlib
+import unittest
+from unittest import mock
+
+import api
+import metrics
+
+
+class TestMetrics(unittest.TestCase):
+    def test_counter(self):
+        counter = metrics.Counter("requests_total", "Requests", ("code",), registry=None)
+        counter.inc(200)
+        counter.inc(200)
+        counter.inc(404)
+        self.assertEqual(2, counter.get(200))
+        self.assertEqual(
+            [
+                "# HELP requests_total Requests",
+                "# TYPE requests_total counter",
+                'requests_total{code="200"} 2',
+                'requests_total{code="404"} 1',
+            ],
+            counter.render(),
+        )
+
+    def test_labels_checked(self):
+        counter = metrics.Counter("requests_total", "Requests", ("code",), registry=None)
+        self.assertRaises(ValueError, counter.inc)
+
+    def test_histogram(self):
+        histogram = metrics.Histogram("latency", "Latency", buckets=(0.1, 1), registry=None)
+        for value in (0.05, 0.1, 0.5, 2):
+            histogram.observe(value)
+        self.assertEqual(4, histogram.get_count())
+        self.assertEqual(
+            [
+                'latency_bucket{le="0.1"} 2',
+                'latency_bucket{le="1"} 3',
+                'latency_bucket{le="+Inf"} 4',
+                "latency_sum 2.65",
+                "latency_count 4",
+            ],
+            histogram.render()[2:],
+        )
+
+    def test_escape(self):
+        counter = metrics.Counter("calls_total", "Calls", ("name",), registry=None)
+        counter.inc('a"b\\')
+        self.assertEqual('calls_total{name="a\\"b\\\\"} 1', counter.render()[-1])
+
+    def test_abstract(self):
+        with self.assertRaises(TypeError):
+            metrics.Metric("metric", "Metric", registry=None)
+
+    def test_render(self):
+        registry = []
+        metrics.Counter("a_total", "A", registry=registry).inc()
+        metrics.Histogram("b", "B", registry=registry)
+        text = metrics.render(registry).decode("utf-8")
+        self.assertTrue(text.endswith("a_total 1\n# HELP b B\n# TYPE b histogram\n"))
+
+
+class TestMethodMetrics(unittest.TestCase):
+    def setUp(self):
+        for metric in metrics.REGISTRY:
+            metric.clear()
+
+    def get_request(self, method, arguments):
+        request = {"account": "horns&hoofs", "login": "h&f", "method": method, "arguments": arguments}
+        msg = request["account"] + request["login"] + api.SALT
+        request["token"] = hashlib.sha512(msg.encode("utf-8")).hexdigest()
+        return {"body": request, "headers": {}}
+
+    def test_instrumented(self):
+        api.method_handler(self.get_request("online_score", {"phone": "79175002040", "email": "a@b"}), {}, None)
+        api.method_handler(self.get_request("online_score", {"phone": "79175002040"}), {}, None)
+        api.method_handler(self.get_request("unknown_method", {}), {}, None)
+
+        self.assertEqual(2, api.METHOD_REQUESTS.get("online_score"))
+        self.assertEqual(1, api.METHOD_ERRORS.get("online_score", api.INVALID_REQUEST))
+        self.assertEqual(1, api.METHOD_ERRORS.get("unknown", api.INVALID_REQUEST))
+        self.assertEqual(2, api.METHOD_LATENCY.get_count("online_score"))
+        self.assertEqual(3, api.AUTH_LATENCY.get_count())
+        self.assertEqual(2, api.STAGE_LATENCY.get_count("online_score", "validate"))
+        self.assertEqual(1, api.STAGE_LATENCY.get_count("online_score", "do"))
+
+    def test_stream_observed(self):
+        request = self.get_request("clients_interests", {"client_ids": [1, 2, 3]})
+        with mock.patch.object(api.ClientInterestsHandler, "stream_threshold", 1), mock.patch.object(
+            api.ClientInterestsHandler, "page_size", 2
+        ):
+            stream, code = api.method_handler(request, {}, None)
+        self.assertIsInstance(stream, api.InterestsStream)
+        self.assertEqual(1, api.STAGE_LATENCY.get_count("clients_interests", "do"))
+        self.assertEqual(0, api.STAGE_LATENCY.get_count("clients_interests", "stream"))
+        self.assertEqual(2, len(list(stream)))
+        self.assertEqual(1, api.STAGE_LATENCY.get_count("clients_interests", "stream"))
+
+    def test_failed_do_counted(self):
+        request = self.get_request("clients_interests", {"client_ids": [1]})
+
+        class BrokenStore:
+            def get_many(self, keys):
+                raise ValueError("broken")
+
+        self.assertRaises(ValueError, api.method_handler, request, {}, BrokenStore())
+        self.assertEqual(1, api.METHOD_ERRORS.get("clients_interests", api.INTERNAL_ERROR))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import asyncio
+import datetime
+import unittest
+
+import scoring
+from tests.utils import cases
+
+
+class MemoryStore:
+    def __init__(self):
+        self.cache = {}
+
+    def cache_get(self, key):
+        return self.cache.get(key, (None,))[0]
+
+    def cache_set(self, key, value, expire=None):
+        self.cache[key] = (value, expire)
+        return True
+
+
+class InterestsStore:
+    def __init__(self, interests):
+        self.interests = interests
+        self.requests = []
+
+    def get_many(self, keys):
+        self.requests.append(keys)
+        return {k: v for k, v in self.interests.items() if k in keys}
+
+
+class BrokenStore:
+    def cache_get(self, key):
+        raise ConnectionError("Connection failed")
+
+    def cache_set(self, key, value, expire=None):
+        raise ConnectionError("Connection failed")
+
+
+class AsyncMemoryStore(MemoryStore):
+    async def cache_get(self, key):
+        return super().cache_get(key)
+
+    async def cache_set(self, key, value, expire=None):
+        return super().cache_set(key, value, expire)
+
+
+class TestGetScore(unittest.TestCase):
+    arguments = {
+        "phone": "79175002040",
+        "email": "stupnikov@otus.ru",
+        "birthday": datetime.date(2000, 1, 1),
+        "gender": 1,
+        "first_name": "a",
+        "last_name": "b",
+    }
+
+    def test_score_cached(self):
+        store = MemoryStore()
+        self.assertEqual(5.0, scoring.get_score(store, **self.arguments))
+        key = scoring.get_score_key(**self.arguments)
+        self.assertEqual((5.0, scoring.SCORE_CACHE_TTL), store.cache[key])
+
+        store.cache[key] = (1.5, None)
+        self.assertEqual(1.5, scoring.get_score(store, **self.arguments))
+
+    @cases([None, {}, BrokenStore()])
+    def test_store_fails_open(self, store):
+        self.assertEqual(5.0, scoring.get_score(store, **self.arguments))
+
+    @cases(["phone", "email", "birthday", "gender", "first_name", "last_name"])
+    def test_key_depends_on_argument(self, name):
+        arguments = dict(self.arguments, **{name: None})
+        self.assertNotEqual(scoring.get_score_key(**self.arguments), scoring.get_score_key(**arguments))
+
+    def test_score_cached_async(self):
+        store = AsyncMemoryStore()
+        self.assertEqual(5.0, asyncio.run(scoring.get_score_async(store, **self.arguments)))
+        store.cache[scoring.get_score_key(**self.arguments)] = (1.5, None)
+        self.assertEqual(1.5, asyncio.run(scoring.get_score_async(store, **self.arguments)))
+
+
+class TestGetInterests(unittest.TestCase):
+    def setUp(self):
+        self.store = InterestsStore({"i:1": '["cars", "pets"]', "i:2": '["books"]'})
+
+    def test_single_round_trip(self):
+        interests = scoring.get_interests_many(self.store, [1, 2, 1, 3])
+        self.assertEqual([["i:1", "i:2", "i:3"]], self.store.requests)
+        self.assertEqual([1, 2, 3], list(interests))
+        self.assertEqual(["cars", "pets"], interests[1])
+        self.assertEqual(["books"], interests[2])
+        self.assertEqual(2, len(interests[3]))
+
+    def test_get_interests(self):
+        self.assertEqual(["books"], scoring.get_interests(self.store, 2))
+
+    @cases([None, {}])
+    def test_no_store(self, store):
+        interests = scoring.get_interests_many(store, [1, 2])
+        self.assertTrue(all(len(v) == 2 for v in interests.values()))
+
+
+if __name__ == "__main__":
+    unittest.main()
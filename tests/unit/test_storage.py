@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import threading
+import time
+import unittest
+
+import tarantool
+
+import api
+from benchmarks.load import sign
+import storage
+from storage import CachedStorage, CircuitBreaker, InMemoryStorage, LocalCache, RetryPolicy, TarantoolPool
+
+
+class Timer:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class Store:
+    def __init__(self):
+        self.cache = {}
+        self.ttl = {}
+        self.calls = 0
+        self.get_many_calls = []
+
+    def get(self, key):
+        return "value"
+
+    def get_many(self, keys):
+        self.get_many_calls.append(keys)
+        return {key: '["cars", "pets"]' for key in keys if key != "i:3"}
+
+    def cache_get(self, key):
+        return self.cache_get_ttl(key)[0]
+
+    def cache_get_ttl(self, key):
+        self.calls += 1
+        return self.cache.get(key), self.ttl.get(key)
+
+    def cache_set(self, key, value, expire=None):
+        self.cache[key] = value
+        return True
+
+
+class Flaky:
+    def __init__(self, failures, error=ConnectionError):
+        self.failures = failures
+        self.error = error
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.error("Connection lost")
+        return "ok"
+
+
+class TestRetryPolicy(unittest.TestCase):
+    def test_retry(self):
+        f = Flaky(failures=1)
+        self.assertEqual("ok", RetryPolicy(attempts=3, deadline=1)(f)())
+        self.assertEqual(2, f.calls)
+
+    def test_attempts(self):
+        f = Flaky(failures=5)
+        with self.assertRaises(ConnectionError):
+            RetryPolicy(attempts=2, deadline=1)(f)()
+        self.assertEqual(2, f.calls)
+
+    def test_deadline(self):
+        f = Flaky(failures=5)
+        with self.assertRaises(ConnectionError):
+            RetryPolicy(attempts=10, deadline=0.15)(f)()
+        self.assertEqual(2, f.calls)
+
+    def test_request_errors_not_retried(self):
+        f = Flaky(failures=1, error=ValueError)
+        with self.assertRaises(ValueError):
+            RetryPolicy(attempts=3, deadline=1)(f)()
+        self.assertEqual(1, f.calls)
+
+    def test_fallback(self):
+        f = Flaky(failures=5)
+        self.assertIsNone(RetryPolicy(attempts=1, deadline=0, fallback=None)(f)())
+        self.assertEqual(1, f.calls)
+
+    def test_circuit_breaker(self):
+        timer = Timer()
+        breaker = CircuitBreaker(threshold=2, reset_timeout=10, timer=timer)
+        f = Flaky(failures=3)
+        call = RetryPolicy(attempts=1, deadline=0, breaker=breaker, fallback=None)(f)
+        for _ in range(4):
+            self.assertIsNone(call())
+        self.assertEqual(2, f.calls)
+
+        timer.now = 10
+        self.assertIsNone(call())
+        self.assertIsNone(call())
+        self.assertEqual(3, f.calls)
+
+        timer.now = 20
+        self.assertEqual("ok", call())
+        self.assertEqual("ok", call())
+        self.assertEqual(5, f.calls)
+
+    def test_single_trial_when_half_open(self):
+        timer = Timer()
+        breaker = CircuitBreaker(threshold=1, reset_timeout=10, timer=timer)
+        breaker.failure()
+        self.assertFalse(breaker.allow())
+        timer.now = 10
+        self.assertTrue(breaker.allow())
+        # the trial is in flight, concurrent calls are short-circuited
+        self.assertFalse(breaker.allow())
+        breaker.success()
+        self.assertTrue(breaker.allow())
+        self.assertTrue(breaker.allow())
+
+
+class TestLocalCache(unittest.TestCase):
+    def setUp(self):
+        self.timer = Timer()
+        self.cache = LocalCache(max_size=2, ttl=10, timer=self.timer)
+
+    def test_lru_eviction(self):
+        self.cache.set("a", 1)
+        self.cache.set("b", 2)
+        self.assertEqual(1, self.cache.get("a"))
+        self.cache.set("c", 3)
+        self.assertIsNone(self.cache.get("b"))
+        self.assertEqual(1, self.cache.get("a"))
+        self.assertEqual(3, self.cache.get("c"))
+        self.assertEqual({"size": 2, "hits": 3, "misses": 1, "evictions": 1}, self.cache.stats())
+
+    def test_ttl_expiration(self):
+        self.cache.set("a", 1)
+        self.cache.set("b", 2, expire=5)
+        self.timer.now = 5
+        self.assertEqual(1, self.cache.get("a"))
+        self.assertIsNone(self.cache.get("b"))
+        self.timer.now = 10
+        self.assertIsNone(self.cache.get("a"))
+        self.assertEqual({"size": 0, "hits": 1, "misses": 2, "evictions": 2}, self.cache.stats())
+
+
+class TestCachedStorage(unittest.TestCase):
+    def setUp(self):
+        self.store = Store()
+        self.timer = Timer()
+        self.cached = CachedStorage(self.store, LocalCache(max_size=10, ttl=10, timer=self.timer))
+
+    def test_read_through(self):
+        self.store.cache["a"] = 1
+        self.assertEqual(1, self.cached.cache_get("a"))
+        self.assertEqual(1, self.cached.cache_get("a"))
+        self.assertEqual(1, self.store.calls)
+        self.assertIsNone(self.cached.cache_get("b"))
+        self.assertIsNone(self.cached.cache_get("b"))
+        self.assertEqual(3, self.store.calls)
+
+    def test_backend_expiry_kept(self):
+        self.store.cache["a"] = 1
+        self.store.ttl["a"] = 2
+        self.assertEqual(1, self.cached.cache_get("a"))
+        self.timer.now = 2
+        del self.store.cache["a"]
+        self.assertIsNone(self.cached.cache_get("a"))
+        self.assertEqual(2, self.store.calls)
+
+    def test_write_through(self):
+        self.assertTrue(self.cached.cache_set("a", 1, 60))
+        self.assertEqual(1, self.store.cache["a"])
+        self.assertEqual(1, self.cached.cache_get("a"))
+        self.assertEqual(0, self.store.calls)
+
+    def test_get_many(self):
+        self.assertEqual({"i:1": '["cars", "pets"]'}, self.cached.get_many(["i:1", "i:3"]))
+        expected = {"i:1": '["cars", "pets"]', "i:2": '["cars", "pets"]'}
+        self.assertEqual(expected, self.cached.get_many(["i:1", "i:2"]))
+        # values not stored are not cached
+        self.assertEqual([["i:1", "i:3"], ["i:2"]], self.store.get_many_calls)
+        self.assertEqual(0, self.cached.cache.stats()["size"])
+        self.assertEqual(2, self.cached.interests.stats()["size"])
+
+    def test_interests_served_from_cache(self):
+        arguments = {"client_ids": [1, 2]}
+        request = sign({"account": "a", "login": "b", "method": "clients_interests", "arguments": arguments})
+        for _ in range(2):
+            response, code = api.method_handler({"body": request, "headers": {}}, {}, self.cached)
+            self.assertEqual(api.OK, code)
+            if isinstance(response, api.InterestsStream):
+                response = {cid: interests for page in response for cid, interests in page.items()}
+            self.assertEqual({1: ["cars", "pets"], 2: ["cars", "pets"]}, response)
+        self.assertEqual(1, len(self.store.get_many_calls))
+
+    def test_other_calls_delegated(self):
+        self.assertEqual("value", self.cached.get("a"))
+
+
+class TestInMemoryStorage(unittest.TestCase):
+    def setUp(self):
+        self.timer = Timer()
+        self.store = InMemoryStorage(timer=self.timer)
+
+    def test_get(self):
+        self.assertTrue(self.store.set("i:1", '["cars"]'))
+        self.assertEqual('["cars"]', self.store.get("i:1"))
+        self.assertIsNone(self.store.get("i:2"))
+        self.assertEqual({"i:1": '["cars"]'}, self.store.get_many(["i:1", "i:2"]))
+
+    def test_cache_expiration(self):
+        self.store.cache_set("a", 1.5, 10)
+        self.store.cache_set("b", 2.5)
+        self.timer.now += 4
+        self.assertEqual((1.5, 6), self.store.cache_get_ttl("a"))
+        self.assertEqual((2.5, None), self.store.cache_get_ttl("b"))
+        self.timer.now += 6
+        self.assertIsNone(self.store.cache_get("a"))
+        self.assertEqual(2.5, self.store.cache_get("b"))
+        self.assertEqual(["b"], list(self.store.items))
+
+
+class Space:
+    """
+    Driver space of cache rows, running the expired rows deletion
+    """
+
+    space_no = 0
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.connection = self
+
+    def select(self, key):
+        return [self.rows[key]] if key in self.rows else []
+
+    def eval(self, script, args):
+        assert script == storage.DELETE_EXPIRED
+        _, key, now = args
+        expires = self.rows[key][2]
+        if expires is not None and expires <= now:
+            del self.rows[key]
+
+
+class TestTarantoolConnection(unittest.TestCase):
+    def setUp(self):
+        self.addCleanup(storage.STORAGE_BREAKER.success)
+        self.space = Space({"a": ("a", 1.5, time.time() - 1), "b": ("b", 2.5, None)})
+        self.store = storage.TarantoolConnection()
+        self.store.connection = self.space
+
+    def test_expired_cache_deleted(self):
+        self.assertIsNone(self.store.cache_get("a"))
+        self.assertEqual(2.5, self.store.cache_get("b"))
+        self.assertEqual(["b"], list(self.space.rows))
+        self.assertIsNone(self.store.cache_get("a"))
+
+    def test_cache_ttl(self):
+        self.space.rows["c"] = ("c", 3.5, time.time() + 60)
+        value, ttl = self.store.cache_get_ttl("c")
+        self.assertEqual(3.5, value)
+        self.assertTrue(59 < ttl <= 60)
+        self.assertEqual((2.5, None), self.store.cache_get_ttl("b"))
+
+
+class Connection:
+    created = 0
+
+    def __init__(self):
+        Connection.created += 1
+        self.alive = True
+        self.closed = False
+        self.connection = None
+
+    def get_connection(self):
+        return "space"
+
+    def ping(self):
+        return self.alive
+
+    def close(self):
+        self.closed = True
+
+    def get(self, key):
+        if not self.alive:
+            raise ValueError("Connection lost")
+        return key
+
+
+class NetworkDown:
+    def __init__(self):
+        self.connection = self
+
+    def select(self, key):
+        raise tarantool.error.NetworkError(ConnectionRefusedError(111, "Connection refused"))
+
+    replace = select
+
+    def ping(self, notime=False):
+        raise tarantool.error.NetworkError(ConnectionRefusedError(111, "Connection refused"))
+
+    def close(self):
+        pass
+
+
+class BrokenConnection(storage.TarantoolConnection):
+    """
+    Store going down after the first connection
+    """
+
+    created = 0
+
+    def get_connection(self):
+        BrokenConnection.created += 1
+        if BrokenConnection.created > 1:
+            raise ConnectionError("Connection refused")
+        return NetworkDown()
+
+
+class TestTarantoolPool(unittest.TestCase):
+    def setUp(self):
+        self.addCleanup(storage.STORAGE_BREAKER.success)
+        Connection.created = 0
+        self.pool = TarantoolPool(Connection, min_size=1, max_size=2, timeout=0.1, check_interval=60)
+
+    def test_reuse(self):
+        self.assertEqual(1, Connection.created)
+        self.assertEqual("a", self.pool.get("a"))
+        self.assertEqual("b", self.pool.get("b"))
+        self.assertEqual(1, Connection.created)
+
+    def test_checkout_timeout(self):
+        first, second = self.pool.acquire(), self.pool.acquire()
+        self.assertEqual(2, Connection.created)
+        with self.assertRaises(TimeoutError):
+            self.pool.acquire()
+        self.pool.release(first)
+        self.assertIs(first, self.pool.acquire())
+
+    def test_broken_connection_replaced(self):
+        with self.pool.connection() as connection:
+            pass
+        connection.alive = False
+        with self.assertRaises(ValueError):
+            self.pool.get("a")
+        self.assertEqual("a", self.pool.get("a"))
+        self.assertTrue(connection.closed)
+        self.assertEqual(2, Connection.created)
+
+    def test_cache_failure_checks_connection(self):
+        BrokenConnection.created = 0
+        pool = TarantoolPool(BrokenConnection, min_size=1, max_size=1, timeout=0.1, check_interval=60)
+        for _ in range(3):
+            # cache fails to a miss, the failed connection is pinged and replaced
+            self.assertIsNone(pool.cache_get("a"))
+            self.assertFalse(pool.cache_set("a", 1))
+        # the breaker opened on the failed calls and connects, no more connects are tried
+        self.assertEqual(4, BrokenConnection.created)
+        self.assertIsNotNone(storage.STORAGE_BREAKER.opened)
+        with self.assertRaises(storage.StorageUnavailable):
+            pool.get_many(["a"])
+        self.assertEqual(4, BrokenConnection.created)
+
+    def test_check_short_circuited(self):
+        breaker = CircuitBreaker(threshold=1, reset_timeout=60)
+        pool = TarantoolPool(Connection, min_size=1, max_size=1, timeout=0.1, check_interval=60, breaker=breaker)
+        with self.assertRaises(ValueError):
+            with pool.connection():
+                raise ValueError("Connection lost")
+        breaker.failure()
+        # the store is down, the connection is kept for a check without pinging it
+        with self.assertRaises(storage.StorageUnavailable):
+            pool.acquire()
+        ((connection, released),) = pool.idle.queue
+        self.assertEqual(float("-inf"), released)
+        self.assertFalse(connection.closed)
+
+    def test_refilled_to_min_size(self):
+        Connection.created = 0
+        self.pool = TarantoolPool(Connection, min_size=2, max_size=3, timeout=0.1, check_interval=60)
+        first, second = self.pool.acquire(), self.pool.acquire()
+        first.alive = second.alive = False
+        self.pool.release(first, check=True)
+        self.pool.release(second, check=True)
+        self.assertEqual("a", self.pool.get("a"))
+        self.assertTrue(second.closed)
+        self.assertEqual(2, self.pool.size)
+        self.assertEqual(2, self.pool.idle.qsize())
+        # the other broken connection is replaced once it is checked out
+        self.pool.acquire(), self.pool.acquire()
+        self.assertTrue(first.closed)
+        self.assertEqual(2, self.pool.size)
+        self.assertEqual(4, Connection.created)
+
+    def test_concurrent_checkout(self):
+        self.pool = TarantoolPool(Connection, min_size=0, max_size=2, timeout=5)
+        results = []
+
+        def worker():
+            for i in range(50):
+                with self.pool.connection() as connection:
+                    results.append(connection)
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(200, len(results))
+        self.assertLessEqual(Connection.created, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()